@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+'''
+Headless benchmark harness.
+
+Runs netflix_penguin.Application under a virtual X server (Xvfb, unless a
+DISPLAY is already available) against a local server serving Netflix-like
+browse, title and watch pages, measuring startup, navigation, navigation
+policy decisions, popup creation and Preferences opening.
+
+Every run is a separate process sharing the same temporary profile, so the
+first run is a cold start and the following ones are warm.
+
+Usage: python benchmarks/harness.py [--runs N] [--output FILE]
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+benchmarks = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(benchmarks))
+sys.path.insert(0, benchmarks)
+
+import server  # noqa
+
+timeout = 120
+
+
+def start_xvfb():
+    read, write = os.pipe()
+    process = subprocess.Popen(
+        ['Xvfb', '-displayfd', str(write), '-screen', '0', '1280x800x24',
+         '-nolisten', 'tcp'],
+        pass_fds=(write,),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        )
+    os.close(write)
+    with os.fdopen(read) as f:
+        display = f.readline().strip()
+    return process, ':%s' % display
+
+
+def summarize(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {
+        'min': min(values),
+        'median': statistics.median(values),
+        'max': max(values),
+        }
+
+
+def flatten(data, prefix=''):
+    for key, value in data.items():
+        if isinstance(value, dict):
+            for item in flatten(value, '%s%s.' % (prefix, key)):
+                yield item
+        else:
+            yield '%s%s' % (prefix, key), value
+
+
+def parent(args):
+    httpd = server.start()
+    base = 'http://%s:%d' % httpd.server_address
+    profile = tempfile.mkdtemp(prefix='netflix-penguin-benchmark-')
+    policy = os.path.join(profile, 'policy.json')
+    with open(policy, 'w') as f:
+        json.dump({
+            'schemes': ['http'],
+            'accept': {
+                '%s:%d' % httpd.server_address: ['browse', 'title', 'watch'],
+                },
+            }, f)
+
+    env = dict(
+        os.environ,
+        XDG_CACHE_HOME=os.path.join(profile, 'cache'),
+        XDG_CONFIG_HOME=os.path.join(profile, 'config'),
+        XDG_DATA_HOME=os.path.join(profile, 'data'),
+        )
+    xvfb = None
+    if not env.get('DISPLAY') or args.xvfb:
+        xvfb, env['DISPLAY'] = start_xvfb()
+
+    runs = []
+    try:
+        for run in range(args.runs):
+            process = subprocess.run(
+                [sys.executable, __file__, '--child', base, policy],
+                env=env,
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+                timeout=timeout,
+                )
+            lines = process.stdout.strip().splitlines()
+            if process.returncode or not lines:
+                print('run %d failed (exit code %d)' % (
+                    run, process.returncode))
+                continue
+            result = json.loads(lines[-1])
+            result['run'] = run
+            runs.append(result)
+            print('run %d: window %.1f ms, first commit %.1f ms' % (
+                run,
+                result['startup'].get('window', 0) * 1000,
+                result['startup'].get('commit', 0) * 1000,
+                ))
+    finally:
+        if xvfb:
+            xvfb.terminate()
+        httpd.shutdown()
+        shutil.rmtree(profile, ignore_errors=True)
+
+    metrics = {}
+    for result in runs:
+        for key, value in flatten(result):
+            if key != 'run' and isinstance(value, (int, float)):
+                metrics.setdefault(key, []).append(value)
+    output = {
+        'timestamp': time.time(),
+        'python': sys.version.split()[0],
+        'runs': runs,
+        'summary': {
+            key: summarize(values)
+            for key, values in sorted(metrics.items())
+            },
+        }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+    print('results written to %s' % args.output)
+    return 0 if len(runs) == args.runs else 1
+
+
+def child(base, policy):
+    import netflix_penguin
+    from netflix_penguin.gi import Gio, GLib, WebKit2
+
+    class BenchmarkApplication(netflix_penguin.Application):
+        navigations = ('/title/1', '/watch/1', '/browse')
+
+        def __init__(self):
+            super(BenchmarkApplication, self).__init__()
+            self.set_flags(self.get_flags() | Gio.ApplicationFlags.NON_UNIQUE)
+            self.results = {}
+            self.steps = None
+            self.committed = None
+
+        def on_load_change(self, account, webview, event):
+            super(BenchmarkApplication, self).on_load_change(
+                account, webview, event
+                )
+            if event == WebKit2.LoadEvent.COMMITTED:
+                self.committed = time.perf_counter()
+            elif event == WebKit2.LoadEvent.FINISHED:
+                self.advance()
+
+        def on_preferences_size(self, account, usage):
+            super(BenchmarkApplication, self).on_preferences_size(
+                account, usage
+                )
+            if usage.finished:
+                self.advance()
+
+        def advance(self, *args):
+            if self.steps is None:
+                self.steps = self.benchmark()
+            try:
+                next(self.steps)
+            except StopIteration:
+                self.quit()
+            return False
+
+        def benchmark(self):
+            self.results['startup'] = dict(self.startup.marks)
+
+            navigation = self.results['navigation'] = {}
+            for path in self.navigations:
+                start = time.perf_counter()
+                self.layout.webview.load_uri(base + path)
+                yield
+                navigation[path.split('/')[1]] = {
+                    'commit': self.committed - start,
+                    'finish': time.perf_counter() - start,
+                    }
+
+            stats = self.profiler.stats.get('webview.decide-policy')
+            if stats and stats[0]:
+                self.results['policy'] = {
+                    'decisions': stats[0],
+                    'mean': stats[1] / stats[0],
+                    'max': stats[2],
+                    }
+
+            popup = self.results['popup'] = {}
+            for name in ('pooled', 'unpooled'):
+                if name == 'unpooled':
+                    self.layout.drain_popup_pool()
+                start = time.perf_counter()
+                layout = self.layout.create_popup()
+                popup['%s_create' % name] = time.perf_counter() - start
+                layout.popup.connect('map-event', self.advance)
+                layout.popup.show()
+                yield
+                popup['%s_show' % name] = time.perf_counter() - start
+                layout.on_close(layout.webview)
+
+            start = time.perf_counter()
+            self.activate_action('preferences', None)
+            yield
+            self.results['preferences'] = time.perf_counter() - start
+
+    app = BenchmarkApplication()
+    GLib.timeout_add_seconds(timeout - 10, app.quit)
+    app.run([
+        'netflix-penguin',
+        '--home-uri', '%s/browse' % base,
+        '--policy', policy,
+        '--profile',
+        ])
+    print(json.dumps(app.results))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument(
+        '--xvfb', action='store_true',
+        help='use Xvfb even if DISPLAY is set'
+        )
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(*args.child)
+    return parent(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
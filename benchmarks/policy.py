@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+'''
+Navigation policy micro-benchmark.
+
+Checks every URI in uris.txt gets the same decision from
+netflix_penguin.policy as from the legacy regular expressions, then times
+both implementations.
+
+Usage: python benchmarks/policy.py [--policy FILE] [--number N]
+'''
+
+import os.path
+import re
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from netflix_penguin import resources  # noqa
+from netflix_penguin.policy import Policy, ACCEPT, POPUP  # noqa
+
+re_accepted_uri = re.compile(
+    r'^https?://www\.netflix\.com/('
+    r'([a-z]{2}/)?([Ll]og|[Ss]ign)([Ii]n|[Oo]ut)([Hh]elp)?|'
+    r'browse|watch|title|[Kk]ids|([Mm]anage)?[Pp]rofiles([Gg]ate)?'
+    r')(|(#|\?|/).*)$'
+    )
+re_popup_uri = re.compile(r'^https?://[^.]+\.facebook\.com/.*$')
+corpus = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uris.txt')
+
+
+def legacy_decide(uri):
+    if re_accepted_uri.match(uri):
+        return ACCEPT
+    if re_popup_uri.match(uri):
+        return POPUP
+    return None
+
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        return [
+            line.strip()
+            for line in f
+            if line.strip() and not line.startswith('#')
+            ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--policy', default=resources.policy)
+    parser.add_argument('--corpus', default=corpus)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    uris = load_corpus(args.corpus)
+    policy = Policy(args.policy)
+    mismatches = [
+        (uri, legacy_decide(uri), policy.decide(uri))
+        for uri in uris
+        if legacy_decide(uri) != policy.decide(uri)
+        ]
+    for uri, expected, found in mismatches:
+        print('MISMATCH %s: expected %s, got %s' % (uri, expected, found))
+
+    def cold():
+        policy.cache.clear()
+        for uri in uris:
+            policy.decide(uri)
+
+    def warm():
+        for uri in uris:
+            policy.decide(uri)
+
+    def legacy():
+        for uri in uris:
+            legacy_decide(uri)
+
+    print('%d uris, %d mismatches' % (len(uris), len(mismatches)))
+    for name, func in (('regex', legacy), ('cold', cold), ('warm', warm)):
+        elapsed = min(timeit.repeat(func, number=args.number, repeat=5))
+        print('%-6s %8.3f us/decision' % (
+            name,
+            elapsed / args.number / len(uris) * 1e6
+            ))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+'''
+Local HTTP server serving pages shaped like Netflix browse, title and watch
+pages, for benchmarking the app without network access.
+'''
+
+import threading
+import http.server
+
+ROWS = 12
+TILES = 16
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>%(title)s</title>
+<style>
+body { background: #141414; color: #fff; font-family: sans-serif; }
+.row { white-space: nowrap; overflow: hidden; margin: 2em 0; }
+.tile { display: inline-block; width: 240px; height: 135px; margin: 2px; }
+</style></head>
+<body>%(body)s</body>
+</html>
+'''
+
+ART = '''<svg xmlns="http://www.w3.org/2000/svg" width="240" height="135">
+<rect width="240" height="135" fill="hsl(%d, 60%%, 30%%)"/>
+<text x="12" y="120" fill="#fff" font-size="24">%d</text>
+</svg>
+'''
+
+
+def tile(index):
+    return (
+        '<a class="tile" href="/title/%d">'
+        '<img src="/art/%d.svg" width="240" height="135"></a>'
+        ) % (index, index)
+
+
+def browse_page():
+    rows = ''.join(
+        '<h2>Row %d</h2><div class="row">%s</div>' % (
+            row,
+            ''.join(tile(row * TILES + column) for column in range(TILES))
+            )
+        for row in range(ROWS)
+        )
+    return PAGE % {'title': 'Browse', 'body': rows}
+
+
+def title_page(index):
+    body = (
+        '<img src="/art/%d.svg" width="720" height="405">'
+        '<h1>Title %d</h1><p>%s</p>'
+        '<a id="play" href="/watch/%d">Play</a>'
+        '<div class="row">%s</div>'
+        ) % (
+            index, index, 'Lorem ipsum dolor sit amet. ' * 40, index,
+            ''.join(tile(index + offset) for offset in range(1, TILES))
+            )
+    return PAGE % {'title': 'Title %d' % index, 'body': body}
+
+
+def watch_page(index):
+    body = (
+        '<video id="player" width="1280" height="720" autoplay muted>'
+        '</video><a href="/title/%d">Back</a>'
+        ) % index
+    return PAGE % {'title': 'Watch %d' % index, 'body': body}
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        parts = self.path.split('?', 1)[0].strip('/').split('/')
+        try:
+            if parts == ['browse']:
+                self.send(browse_page())
+            elif parts[0] == 'title' and len(parts) == 2:
+                self.send(title_page(int(parts[1])))
+            elif parts[0] == 'watch' and len(parts) == 2:
+                self.send(watch_page(int(parts[1])))
+            elif parts[0] == 'art' and len(parts) == 2:
+                index = int(parts[1].split('.')[0])
+                self.send(
+                    ART % (index * 37 % 360, index),
+                    'image/svg+xml',
+                    cache='public, max-age=86400'
+                    )
+            else:
+                self.send_error(404)
+        except ValueError:
+            self.send_error(404)
+
+    def send(self, text, content_type='text/html', cache='no-cache'):
+        data = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', '%s; charset=utf-8' % content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Cache-Control', cache)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(host='127.0.0.1', port=0):
+    '''
+    Start server on a background thread, returns the server instance.
+    '''
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 8000), Handler)
+    print('serving on http://127.0.0.1:8000/browse')
+    server.serve_forever()
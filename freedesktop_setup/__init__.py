@@ -1,9 +1,17 @@
 
+from distutils.command.build import build as BaseBuild
 from setuptools.command.install import install as BaseInstall
 from setuptools.dist import Distribution as BaseDistribution
 
 from .freedesktop import install_desktop
-from .icons import update_icons
+from .icons import build_icons, update_icons
+from .resources import build_resources
+
+
+class build(BaseBuild):
+    sub_commands = [('build_icons', None)] + BaseBuild.sub_commands + [
+        ('build_resources', None),
+        ]
 
 
 class install(BaseInstall):
@@ -15,16 +23,23 @@ class install(BaseInstall):
 
 class Distribution(BaseDistribution):
     default_cmdclass = {
+        'build': build,
+        'build_icons': build_icons,
+        'build_resources': build_resources,
         'install': install,
         'install_desktop': install_desktop,
         'update_icons': update_icons,
         }
 
     desktop_entries = None
+    icons = None
+    icon_sizes = (16, 22, 24, 32, 48, 128, 256, 512)
     icon_themes_dir = None
+    resource_bundles = None
 
     def __init__(self, attrs):
         cmdclass = self.default_cmdclass.copy()
         cmdclass.update(attrs.get('cmdclass', ()))
         attrs['cmdclass'] = cmdclass
+        attrs['data_files'] = list(attrs.get('data_files') or ())
         super(Distribution, self).__init__(attrs)
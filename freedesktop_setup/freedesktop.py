@@ -80,16 +80,27 @@ class install_desktop(Command):
             }
             data.update(desktop_entries.get(script) or ())
             dest_file = os.path.join(dest_dir, '%s.desktop' % script)
+            content = '[Desktop Entry]\n' + ''.join(
+                '%s=%s\n' % (key, value)
+                for key, value in sorted(data.items())
+                )
+            self.outfiles.append(dest_file)
+
+            if self.unchanged(dest_file, content):
+                log.info('skipping %s (up to date)' % dest_file)
+                continue
 
             log.info('writing ' + dest_file)
             with open(dest_file, 'w') as f:
-                f.write('[Desktop Entry]\n')
-                f.writelines([
-                    '%s=%s\n' % (key, value)
-                    for key, value in sorted(data.items())
-                    ])
+                f.write(content)
             os.chmod(dest_file, 0o777 - current_umask)
-            self.outfiles.append(dest_file)
+
+    def unchanged(self, path, content):
+        try:
+            with open(path) as f:
+                return f.read() == content
+        except OSError:
+            return False
 
     def get_inputs(self):
         return []
@@ -1,7 +1,9 @@
 
 import os
 import os.path
+import hashlib
 import subprocess
+import concurrent.futures
 
 from distutils import log
 from distutils.core import Command
@@ -9,6 +11,108 @@ from distutils.errors import DistutilsSetupError
 from distutils.util import change_root, convert_path
 
 
+class build_icons(Command):
+    '''Distutils subcommand to render icon sizes from scalable sources'''
+
+    description = 'Renders PNG icons from SVG into a content-addressed cache'
+
+    user_options = [
+        ('build-dir=', 'b',
+         "directory for rendered icons "
+         "(default: {build-base}/icons)"),
+        ('force', 'f', "render icons even if already cached"),
+        ]
+
+    boolean_options = ['force']
+
+    renderer = ['rsvg-convert', '-w', '{size}', '-h', '{size}',
+                '-o', '{dest}', '{source}']
+    theme_dir = 'share/icons/hicolor'
+
+    def initialize_options(self):
+        self.build_base = None
+        self.build_dir = None
+        self.force = None
+
+    def finalize_options(self):
+        self.set_undefined_options(
+            'build',
+            ('build_base', 'build_base'),
+            ('force', 'force'),
+            )
+        if self.build_dir is None:
+            self.build_dir = os.path.join(self.build_base, 'icons')
+
+    def digest(self, source, sizes):
+        sha = hashlib.sha1(' '.join(map(str, sizes)).encode())
+        with open(source, 'rb') as f:
+            sha.update(f.read())
+        return sha.hexdigest()
+
+    def render(self, source, size, dest):
+        partial = '%s.partial' % dest
+        command = [
+            arg.format(source=source, size=size, dest=partial)
+            for arg in self.renderer
+            ]
+        try:
+            err = subprocess.call(command)
+        except OSError as e:
+            err = e
+        if err:
+            if os.path.exists(partial):
+                os.remove(partial)
+            return False
+        os.replace(partial, dest)
+        return True
+
+    def build(self, name, source, size, dest):
+        fallback = os.path.join(
+            os.path.dirname(source), str(size), '%s.png' % name
+            )
+        if os.path.exists(dest) and not self.force:
+            log.info('skipping %s (cached)' % dest)
+        elif self.dry_run:
+            log.info('rendering %s' % dest)
+        elif self.render(source, size, dest):
+            log.info('rendered %s' % dest)
+        elif os.path.exists(fallback):
+            log.warn('cannot render %s, using %s' % (dest, fallback))
+            return fallback
+        else:
+            raise DistutilsSetupError('cannot render %r' % dest)
+        return dest
+
+    def run(self):
+        dist = self.distribution
+        sizes = sorted(dist.icon_sizes)
+        jobs = []
+        for name, source in sorted((dist.icons or {}).items()):
+            source = convert_path(source)
+            base = os.path.join(self.build_dir, self.digest(source, sizes))
+            for size in sizes:
+                dest = os.path.join(base, str(size), '%s.png' % name)
+                self.mkpath(os.path.dirname(dest))
+                jobs.append((name, source, size, dest))
+            dist.data_files.append(
+                ('%s/scalable/apps' % self.theme_dir, [source])
+                )
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = [executor.submit(self.build, *job) for job in jobs]
+        for (name, source, size, dest), future in zip(jobs, futures):
+            dist.data_files.append((
+                '{0}/{1}x{1}/apps'.format(self.theme_dir, size),
+                [future.result()]
+                ))
+
+    def get_inputs(self):
+        return []
+
+    def get_outputs(self):
+        return []
+
+
 class update_icons(Command):
     '''Distutils subcommand to regenerate icon cache'''
 
@@ -52,10 +156,38 @@ class update_icons(Command):
             return change_root(self.root, path)
         return path
 
+    def changed(self, path, directories, files):
+        '''
+        Get whether any theme directory or installed icon changed after its
+        icon cache.
+
+        Icons overwritten in place keep their source mtime (and leave their
+        directory mtime untouched), but get a newer ctime.
+        '''
+        cachefile = os.path.join(path, '.icon-theme.cache')
+        try:
+            cache_mtime = os.stat(cachefile).st_mtime_ns
+        except OSError:
+            return True
+        for filename in [path] + sorted(directories) + sorted(files):
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                return True
+            if max(stat.st_mtime_ns, stat.st_ctime_ns) > cache_mtime:
+                return True
+        return False
+
+    def update_cache(self, path):
+        try:
+            return subprocess.call(['gtk-update-icon-cache', '-f', path])
+        except BaseException as e:
+            return e
+
     def run(self):
         dist = self.distribution
         prefix = self.convert_path(self.icon_themes_dir or 'share/icons')
-        themes = set()
+        themes = {}
 
         for spec in dist.data_files or ():
             if isinstance(spec, str) or not all(spec):
@@ -64,25 +196,26 @@ class update_icons(Command):
             if not dest.startswith(prefix + os.sep):
                 continue
             name, icon = os.path.relpath(dest, prefix).split(os.sep, 1)
-            themes.add(name)
+            directories, files = themes.setdefault(name, (set(), set()))
+            directories.add(dest)
+            files.update(
+                os.path.join(dest, os.path.basename(source))
+                for source in spec[1]
+                )
 
-        for name in themes:
+        pending = []
+        for name, (directories, files) in sorted(themes.items()):
             path = os.path.join(prefix, name)
             cachefile = os.path.join(path, '.icon-theme.cache')
             permission = (
                 os.access(cachefile, os.W_OK) or
                 os.access(path, os.W_OK) and not os.path.exists(cachefile)
                 )
-            if permission or self.force:
+            if not self.force and not self.changed(path, directories, files):
+                log.info('skipping %s (up to date)' % cachefile)
+            elif permission or self.force:
                 log.info('updating %s' % cachefile)
-                try:
-                    err = subprocess.call(
-                        ['gtk-update-icon-cache', '-f', path]
-                        )
-                except BaseException as e:
-                    err = e
-                if err:
-                    log.error('gtk-update-icon-cache call failed')
+                pending.append(path)
             elif self.force:
                 raise DistutilsSetupError(
                     'no write permissions for %r' % cachefile
@@ -90,6 +223,16 @@ class update_icons(Command):
             else:
                 log.error('no write permissions for %r' % cachefile)
 
+        if not pending:
+            return
+        with concurrent.futures.ThreadPoolExecutor(len(pending)) as executor:
+            results = executor.map(self.update_cache, pending)
+            for path, err in zip(pending, results):
+                if err:
+                    log.error(
+                        'gtk-update-icon-cache call failed for %s' % path
+                        )
+
     def get_inputs(self):
         return []
 
@@ -0,0 +1,81 @@
+
+import os
+import os.path
+import subprocess
+
+from distutils import log
+from distutils.core import Command
+from distutils.dep_util import newer_group
+from distutils.errors import DistutilsExecError
+from distutils.util import convert_path
+
+
+class build_resources(Command):
+    '''Distutils subcommand to compile GResource bundles'''
+
+    description = 'Compiles GResource bundles into the build directory'
+
+    user_options = [
+        ('build-lib=', 'd', "directory to build bundles into"),
+        ('force', 'f', "compile bundles even if up to date"),
+        ]
+
+    boolean_options = ['force']
+
+    compiler = 'glib-compile-resources'
+
+    def initialize_options(self):
+        self.build_lib = None
+        self.force = None
+
+    def finalize_options(self):
+        self.set_undefined_options(
+            'build',
+            ('build_lib', 'build_lib'),
+            ('force', 'force'),
+            )
+
+    def dependencies(self, manifest):
+        output = subprocess.check_output([
+            self.compiler,
+            '--sourcedir', os.path.dirname(manifest),
+            '--generate-dependencies',
+            manifest,
+            ])
+        return [manifest] + output.decode().splitlines()
+
+    def run(self):
+        dist = self.distribution
+        for target, manifest in sorted((dist.resource_bundles or {}).items()):
+            dest = os.path.join(self.build_lib, convert_path(target))
+            manifest = convert_path(manifest)
+            try:
+                sources = self.dependencies(manifest)
+            except (OSError, subprocess.CalledProcessError) as e:
+                log.warn('cannot compile %s (%s), loose files will be used'
+                         % (dest, e))
+                continue
+            if not (self.force or newer_group(sources, dest)):
+                log.info('skipping %s (up to date)' % dest)
+                continue
+            self.mkpath(os.path.dirname(dest))
+            try:
+                self.spawn([
+                    self.compiler,
+                    '--sourcedir', os.path.dirname(manifest),
+                    '--target', dest,
+                    manifest,
+                    ])
+            except DistutilsExecError as e:
+                log.warn('cannot compile %s (%s), loose files will be used'
+                         % (dest, e))
+
+    def get_inputs(self):
+        return []
+
+    def get_outputs(self):
+        dist = self.distribution
+        return [
+            os.path.join(self.build_lib, convert_path(target))
+            for target in sorted(dist.resource_bundles or ())
+            ]
@@ -1,24 +1,41 @@
 
 import re
+import time
+import logging
+import functools
+import collections
 
 from . import __meta__ as meta
 from . import resources
-from .utils import human_size
+from . import performance
+from .utils import human_size, release_memory
 from .layout import BrowserLayout, Layout
+from .policy import Policy, ACCEPT, POPUP
+from .profiling import StartupTimer, SignalProfiler
+from .filters import ContentFilter
+from .warmup import Warmup
+from .plugins import PluginCache
+from .memory import IdleMemoryPolicy
+from .settings import Settings
+from .maintenance import StorageMaintenance
+from .websitedata import WebsiteDataUsage, WebsiteDataCleaner, categories
+from .accounts import Account
+from .playback import PlaybackMonitor
+from .timeline import NetworkTimeline
 from .collections import AttrDefaultDict
-from .gi import Gtk, Gio, Gdk, WebKit2
+from .gi import Gtk, Gio, Gdk, GLib, WebKit2
+
+logger = logging.getLogger(__name__)
 
 
 class Application(Gtk.Application):
     re_pipelight_so = re.compile(r'.*/libpipelight-silverlight[^/]+\.so$')
-    re_accepted_uri = re.compile(
-        r'^https?://www\.netflix\.com/('
-        r'([a-z]{2}/)?([Ll]og|[Ss]ign)([Ii]n|[Oo]ut)([Hh]elp)?|'
-        r'browse|watch|title|[Kk]ids|([Mm]anage)?[Pp]rofiles([Gg]ate)?'
-        r')(|(#|\?|/).*)$'
-        )
-    re_popup_uri = re.compile(r'^https?://[^.]+\.facebook\.com/.*$')
     home_uri = 'http://www.netflix.com/browse'
+    blank_uri = 'about:blank'
+    cache_budget_unit = 1024 ** 2
+    cache_trim_interval = 600
+    session_save_interval = 60
+    playback_overlay_key = Gdk.KEY_F12
 
     def __init__(self, *args, **kwargs):
         super(Application, self).__init__(
@@ -28,38 +45,88 @@ class Application(Gtk.Application):
             **kwargs
             )
         self.options = AttrDefaultDict(lambda: None)
-        self.layout = BrowserLayout(
-            resources.layout,
-            cookie_storage_path=resources.storage
-            )
-        self.menu = Layout(resources.menu)
+        self.startup = StartupTimer()
+        self.profiler = SignalProfiler()
+        self.accounts = collections.OrderedDict()
+        self.account = None
+        self.warmup = None
+        self.playback = None
+        self.timeline = NetworkTimeline()
+        self.session_timer = None
         self.pressed_keys = set()
-        self.fullscreen = False
-        self.layout.connect({
-            'window.window-state-event': self.on_window_state,
-            'window.key-press-event': self.on_window_key_press,
-            'window.key-release-event': self.on_window_key_release,
-            'webview.create': self.on_create_request,
-            'webview.decide-policy': self.on_decide_policy,
-            'webview.load-changed': self.on_load_change,
-            'about.delete-event': self.on_dialog_delete,
-            'preferences.delete-event': self.on_dialog_delete,
-            'about_close.clicked': self.on_dialog_close,
-            'preferences_close.clicked': self.on_dialog_close,
-            'clear_data.clicked': self.on_clear_data,
-            })
-        self.layout.set({
-            'about.program-name': meta.__appname__,
-            'about.version': meta.__version__,
-            'about.authors': [meta.__author__],
-            })
+        self.add_main_option(
+            'unrestricted', 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+            'Allow navigation outside Netflix', None
+            )
+        self.add_main_option(
+            'startup-timing', 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+            'Print time to window and time to first load commit', None
+            )
+        self.add_main_option(
+            'resident', 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+            'Keep running in background when the window is closed', None
+            )
+        self.add_main_option(
+            'performance-profile', 0, GLib.OptionFlags.NONE,
+            GLib.OptionArg.STRING,
+            'Performance profile: %s' % ', '.join(performance.profiles),
+            'NAME'
+            )
+        self.add_main_option(
+            'home-uri', 0, GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+            'Page loaded on startup, instead of the last session', 'URI'
+            )
+        self.add_main_option(
+            'policy', 0, GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+            'Navigation policy allowlist file', 'FILE'
+            )
+        self.add_main_option(
+            'account', 0, GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+            'Open a window for given account, with its own cookies and data',
+            'NAME'
+            )
+        self.add_main_option(
+            'profile', 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+            'Profile signal handlers, or dump profile if already running',
+            None
+            )
+
+    @property
+    def layout(self):
+        '''
+        Layout of the last focused account window.
+        '''
+        return self.account.layout if self.account else None
 
-    def on_clear_data(self, widget):
-        context = self.layout.webview.get_context()
-        context.clear_cache()
-        manager = context.get_cookie_manager()
-        manager.delete_all_cookies()
-        self.update_preferences_size()
+    def on_clear_data(self, account, widget):
+        manager = account.layout.website_data_manager
+        if manager is None:
+            return
+        if account.data_cleaner is None:
+            account.data_cleaner = WebsiteDataCleaner(manager)
+        max_age = int(account.layout.clear_age_combo.get_active_id() or 0)
+        names = [
+            name
+            for name, (check, size, origins)
+            in self.data_category_rows(account.layout)
+            if check.get_active() and check.get_sensitive()
+            ]
+        if names and account.data_cleaner.clear(
+                names, max_age,
+                functools.partial(self.on_data_cleared, account)):
+            widget.set_sensitive(False)
+
+    def on_data_cleared(self, account):
+        account.layout.clear_data.set_sensitive(True)
+        self.update_preferences_size(account)
+
+    def on_clear_age_change(self, account, widget):
+        max_age = int(widget.get_active_id() or 0)
+        for name, (check, size, origins) in self.data_category_rows(
+                account.layout):
+            check.set_sensitive(
+                not max_age or WebsiteDataCleaner.expirable(name)
+                )
 
     def on_dialog_close(self, widget):
         widget.get_toplevel().hide()
@@ -68,22 +135,67 @@ class Application(Gtk.Application):
         source.hide()
         return True
 
-    def on_window_state(self, source, event):
+    def on_window_state(self, account, source, event):
+        account.iconified = bool(
+            Gdk.WindowState.ICONIFIED & event.new_window_state
+            )
+        self.update_background(account)
         fullscreen = Gdk.WindowState.FULLSCREEN & event.new_window_state
-        if fullscreen != self.fullscreen:
-            self.fullscreen = fullscreen
-            self.layout.hover_revealer.set_property('visible', fullscreen)
-            self.layout.hover_revealer.set_reveal_child(not fullscreen)
+        if fullscreen != account.fullscreen:
+            account.fullscreen = fullscreen
+            revealer = account.layout.hover_revealer
+            revealer.set_property('visible', fullscreen)
+            revealer.set_reveal_child(not fullscreen)
 
-    def on_navigation(self, decision):
+    def on_window_active(self, account, window, param):
+        if window.is_active():
+            self.account = account
+        self.update_background(account)
+
+    def update_background(self, account):
+        window = account.layout.window
+        obscured = account.iconified or not window.get_visible()
+        account.idle_memory.update(
+            obscured or not window.is_active(),
+            obscured
+            )
+
+    def is_playing(self, account):
+        webview = account.layout.webview
+        return webview.is_playing_audio() or (
+            self.warmup.page_class(webview.get_uri() or '') == 'watch'
+            )
+
+    def load_policy(self, path):
+        self.policy = Policy(path)
+        self.policy_monitor = Gio.File.new_for_path(
+            self.policy.path
+            ).monitor_file(Gio.FileMonitorFlags.NONE, None)
+        self.policy_monitor.connect('changed', self.on_policy_change)
+        if self.warmup:
+            self.warmup.policy = self.policy
+
+    def on_policy_change(self, monitor, file, other_file, event):
+        if event in (
+          Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+          Gio.FileMonitorEvent.CREATED,
+          ):
+            try:
+                self.policy.reload()
+            except (OSError, ValueError, KeyError) as e:
+                logger.error('cannot reload %s: %s', self.policy.path, e)
+
+    def on_navigation(self, account, decision):
         action = decision.get_navigation_action()
         request = action.get_request()
         uri = request.get_uri()
         navtype = action.get_navigation_type()
+        rule = self.policy.decide(uri)
         if (
           self.options.unrestricted or
-          self.re_accepted_uri.match(uri) or (
-              self.re_popup_uri.match(uri) and
+          rule == ACCEPT or
+          uri == self.blank_uri or (
+              rule == POPUP and
               navtype == WebKit2.NavigationType.OTHER
               ) or
           navtype in (
@@ -94,62 +206,96 @@ class Application(Gtk.Application):
             decision.use()
             return True
         if navtype == WebKit2.NavigationType.LINK_CLICKED:
-            Gtk.show_uri_on_window(self.layout.window, uri, Gdk.CURRENT_TIME)
+            Gtk.show_uri_on_window(
+                account.layout.window,
+                uri,
+                Gdk.CURRENT_TIME
+                )
         decision.ignore()
         return True
 
-    def on_create_request(self, webview, action):
+    def on_create_request(self, account, webview, action):
         request = action.get_request()
         uri = request.get_uri()
-        if self.re_popup_uri.match(uri):
-            layout = self.layout.create_popup()
+        if self.policy.decide(uri) == POPUP:
+            layout = account.layout.create_popup()
             layout.popup.set_application(self)
             layout.popup.show()
             return layout.webview
 
-    def on_decide_policy(self, webview, decision, type):
+    def on_decide_policy(self, account, webview, decision, type):
         if type == WebKit2.PolicyDecisionType.NAVIGATION_ACTION:
-            return self.on_navigation(decision)
+            return self.on_navigation(account, decision)
 
-    def on_window_key_press(self, source, event):
+    def on_window_key_press(self, account, source, event):
         if event.keyval in self.pressed_keys:
             return True
         self.pressed_keys.add(event.keyval)
-        if self.fullscreen:
+        layout = account.layout
+        if event.keyval == self.playback_overlay_key:
+            layout.toggle_playback_overlay()
+            return True
+        if account.fullscreen:
             if event.keyval in (Gdk.KEY_Escape, Gdk.KEY_F11):
-                self.layout.window.unfullscreen()
+                layout.window.unfullscreen()
                 return True
             elif event.keyval == Gdk.KEY_Alt_L:
-                value = self.layout.hover_revealer.get_reveal_child()
-                self.layout.hover_revealer.set_reveal_child(not value)
+                value = layout.hover_revealer.get_reveal_child()
+                layout.hover_revealer.set_reveal_child(not value)
                 return True
         elif event.keyval == Gdk.KEY_F11:
-            self.layout.window.fullscreen()
+            layout.window.fullscreen()
             return True
         return False
 
     def on_window_key_release(self, source, event):
         self.pressed_keys.discard(event.keyval)
 
-    def on_plugins(self, source, res):
-        pipelight = [
-            plugin
+    def check_plugins(self, account):
+        cached = self.plugin_cache.get()
+        if cached is None:
+            account.layout.webview.get_context().get_plugins(
+                None,
+                functools.partial(self.on_plugins, account),
+                time.perf_counter()
+                )
+            return
+        self.startup.measure('plugins-saved', cached['elapsed'])
+        self.update_plugins(account, cached['plugins'])
+
+    def on_plugins(self, account, source, res, start):
+        plugins = [
+            plugin.get_path()
             for plugin in source.get_plugins_finish(res)
-            if self.re_pipelight_so.match(plugin.get_path())
+            ]
+        elapsed = time.perf_counter() - start
+        self.startup.measure('plugins-scan', elapsed)
+        self.plugin_cache.set(plugins, elapsed)
+        self.update_plugins(account, plugins)
+
+    def update_plugins(self, account, plugins):
+        pipelight = [
+            path
+            for path in plugins
+            if self.re_pipelight_so.match(path)
             ]
         if not pipelight:
-            self.layout.nosilverlight_info.set_property('visible', True)
+            account.layout.nosilverlight_info.set_property('visible', True)
 
-    def on_load_change(self, webview, event):
+    def on_load_change(self, account, webview, event):
+        self.timeline.on_load_change(webview, event)
+        layout = account.layout
         if event == WebKit2.LoadEvent.STARTED:
-            self.layout.set({
+            layout.set({
                 'reload_button.sensitive': False,
                 'hover_reload_button.sensitive': False,
                 })
         elif event == WebKit2.LoadEvent.COMMITTED:
-            cgb = self.layout.webview.can_go_back()
-            cgf = self.layout.webview.can_go_forward()
-            self.layout.set({
+            self.startup.mark('commit')
+            self.warmup.on_commit(webview)
+            cgb = webview.can_go_back()
+            cgf = webview.can_go_forward()
+            layout.set({
                 'back_button.sensitive': cgb,
                 'hover_back_button.sensitive': cgb,
                 'forw_button.sensitive': cgf,
@@ -158,21 +304,161 @@ class Application(Gtk.Application):
         elif event == WebKit2.LoadEvent.REDIRECTED:
             pass
         elif event == WebKit2.LoadEvent.FINISHED:
-            self.layout.set({
+            if 'finish' not in self.startup.marks:
+                self.schedule_cache_trim()
+                GLib.timeout_add_seconds(
+                    self.cache_trim_interval,
+                    self.on_cache_trim_timeout
+                    )
+            self.startup.mark('finish')
+            layout.set({
                 'reload_button.sensitive': True,
                 'hover_reload_button.sensitive': True,
                 })
 
     def on_about(self, source, param):
+        self.layout.set({
+            'about.program-name': meta.__appname__,
+            'about.version': meta.__version__,
+            'about.authors': [meta.__author__],
+            })
         self.layout.about.show()
 
     def on_preferences(self, source, param):
-        self.update_preferences_size()
-        self.layout.preferences.show()
+        account = self.account
+        layout = account.layout
+        layout.cache_budget_spin.set_value(
+            self.settings.cache_budget // self.cache_budget_unit
+            )
+        combo = layout.performance_profile_combo
+        combo.remove_all()
+        for name, profile in performance.profiles.items():
+            combo.append(name, profile['label'])
+        combo.set_active_id(self.settings.performance_profile)
+        layout.resident_check.set_active(self.settings.resident)
+        layout.popup_pool_spin.set_value(self.settings.popup_pool_size)
+        self.update_preferences_popups(layout)
+        self.update_preferences_filter(layout)
+        self.update_preferences_size(account)
+        self.update_preferences_evicted(layout)
+        layout.preferences.show()
+
+    def on_performance_change(self, widget):
+        name = widget.get_active_id()
+        if name and name != self.settings.performance_profile:
+            self.set_performance_profile(name)
 
-    def update_preferences_size(self):
-        size = resources.count_cache_size()
-        self.layout.data_size_label.set_label(human_size(size))
+    def set_performance_profile(self, name):
+        if name not in performance.profiles:
+            logger.error('unknown performance profile %r', name)
+            return
+        self.settings.performance_profile = name
+        self.settings.save()
+        for account in self.accounts.values():
+            account.layout.set_performance_profile(name)
+
+    def on_cache_budget_change(self, widget):
+        budget = widget.get_value_as_int() * self.cache_budget_unit
+        if budget != self.settings.cache_budget:
+            self.settings.cache_budget = budget
+            self.settings.save()
+            self.schedule_cache_trim()
+
+    def schedule_cache_trim(self):
+        GLib.idle_add(self.on_cache_trim, priority=GLib.PRIORITY_LOW)
+
+    def on_cache_trim(self):
+        if self.settings.cache_budget:
+            resources.cache_trimmer.trim(
+                self.settings.cache_budget,
+                self.on_cache_trimmed
+                )
+        return False
+
+    def on_cache_trim_timeout(self):
+        self.on_cache_trim()
+        return True
+
+    def on_cache_trimmed(self, size, evicted):
+        if evicted:
+            logger.info('evicted %s of cache', human_size(evicted))
+            for account in self.accounts.values():
+                if 'preferences' in account.layout.built:
+                    self.update_preferences_size(account)
+                    self.update_preferences_evicted(account.layout)
+        return False
+
+    def update_preferences_evicted(self, layout):
+        evicted = resources.cache_trimmer.evicted
+        layout.evicted_size_label.set_label(human_size(evicted))
+
+    def on_popup_pool_change(self, widget):
+        size = widget.get_value_as_int()
+        if size == self.settings.popup_pool_size:
+            return
+        self.settings.popup_pool_size = size
+        self.settings.save()
+        for account in self.accounts.values():
+            layout = account.layout
+            layout.popup_pool_size = size
+            layout.drain_popup_pool()
+            if layout.webview and not account.resume_uri:
+                layout.schedule_popup_pool()
+
+    def update_preferences_popups(self, layout):
+        layout.popup_stats_label.set_label(
+            '{hits} hits, {misses} misses'.format(**layout.popup_stats)
+            )
+
+    def update_preferences_filter(self, layout):
+        content_filter = self.content_filter
+        label = layout.blocked_requests_label
+        if content_filter.error:
+            label.set_label('Filter not compiled')
+            label.set_tooltip_text(content_filter.error)
+        elif not content_filter.installed:
+            label.set_label('Filter not installed')
+        else:
+            label.set_label(str(content_filter.blocked))
+
+    def update_preferences_size(self, account):
+        manager = account.layout.website_data_manager
+        if manager is None:
+            return
+        if account.data_usage is None:
+            account.data_usage = WebsiteDataUsage(
+                manager,
+                account.layout.cookie_storage_path
+                )
+        account.data_usage.update(
+            functools.partial(self.on_preferences_size, account)
+            )
+
+    def on_preferences_size(self, account, usage):
+        layout = account.layout
+        layout.data_size_label.set_label(human_size(usage.total))
+        for name, (check, size, origins) in self.data_category_rows(layout):
+            size.set_label(human_size(usage.sizes[name]))
+            origins.set_label('{} sites'.format(usage.origins[name]))
+
+    def data_category_rows(self, layout):
+        '''
+        Iterate category names along with their preferences grid row
+        widgets (check button, size and origin labels), creating them.
+        '''
+        grid = layout.data_categories_grid
+        for row, (name, category) in enumerate(categories.items()):
+            if not grid.get_child_at(0, row):
+                check = Gtk.CheckButton(
+                    label=category['label'],
+                    active=True,
+                    visible=True
+                    )
+                grid.attach(check, 0, row, 1, 1)
+                for column in (1, 2):
+                    label = Gtk.Label(visible=True, xalign=0)
+                    grid.attach(label, column, row, 1, 1)
+            yield name, [grid.get_child_at(column, row) for column in range(3)]
 
     def do_startup(self):
         Gtk.Application.do_startup(self)
@@ -186,23 +472,349 @@ class Application(Gtk.Application):
         action.connect('activate', self.on_about)
         self.add_action(action)
 
+        action = Gio.SimpleAction.new('export-har', None)
+        action.connect('activate', self.on_export_har)
+        self.add_action(action)
+
+        action = Gio.SimpleAction.new('dump-profile', None)
+        action.connect('activate', self.on_dump_profile)
+        self.add_action(action)
+
         action = Gio.SimpleAction.new('quit', None)
         action.connect('activate', self.on_quit)
         self.add_action(action)
 
+        if resources.bundled:
+            icon_theme = Gtk.IconTheme.get_default()
+            icon_theme.add_resource_path(resources.bundle_icons)
+
+        self.menu = Layout(resources.menu)
         self.set_app_menu(self.menu['menu'])
+        self.set_accels_for_action('app.quit', ['<Primary>q'])
+
+        self.settings = Settings(resources.settings)
+
+        self.load_policy(resources.policy)
+        self.warmup = Warmup(resources.warmup, self.policy)
+        self.plugin_cache = PluginCache(resources.plugins)
+
+        self.content_filter = ContentFilter(
+            resources.filters,
+            resources.filter_store
+            )
+        self.playback = PlaybackMonitor(resources.playback)
+        self.account = self.create_account(None)
+        self.startup.mark('startup')
+
+    def create_account(self, name):
+        '''
+        Create account window layout, raises ValueError on invalid names.
+        '''
+        account = Account(name)
+        account.layout = BrowserLayout(
+            resources.layout,
+            cookie_storage_path=account.storage,
+            cache_dir=account.cache_dir,
+            data_dir=account.data_dir,
+            popup_pool_size=self.settings.popup_pool_size,
+            performance_profile=self.settings.performance_profile,
+            content_filter=self.content_filter,
+            playback_monitor=self.playback,
+            )
+        if name:
+            layout = account.layout
+            title = '{} ({})'.format(layout.headerbar.get_title(), name)
+            layout.window.set_title(title)
+            layout.headerbar.set_title(title)
+            layout.hover_headerbar.set_title(title)
+        account.idle_memory = IdleMemoryPolicy(
+            account.layout,
+            self.settings.idle_memory_delay,
+            functools.partial(self.is_playing, account)
+            )
+        # unprofiled, so it can be disconnected after the first frame
+        account.layout.window.connect('draw', self.on_window_draw)
+        bind = functools.partial
+        account.layout.connect({
+            'window.delete-event': bind(self.on_window_delete, account),
+            'window.notify::is-active': bind(self.on_window_active, account),
+            'window.window-state-event': bind(self.on_window_state, account),
+            'window.key-press-event': bind(self.on_window_key_press, account),
+            'window.key-release-event': self.on_window_key_release,
+            'about.delete-event': self.on_dialog_delete,
+            'preferences.delete-event': self.on_dialog_delete,
+            'about_close.clicked': self.on_dialog_close,
+            'preferences_close.clicked': self.on_dialog_close,
+            'clear_data.clicked': bind(self.on_clear_data, account),
+            'clear_age_combo.changed': bind(self.on_clear_age_change, account),
+            'cache_budget_spin.value-changed': self.on_cache_budget_change,
+            'popup_pool_spin.value-changed': self.on_popup_pool_change,
+            'performance_profile_combo.changed': self.on_performance_change,
+            'resident_check.toggled': self.on_resident_toggle,
+            })
+        self.accounts[name] = account
+        return account
+
+    def close_account(self, account):
+        self.save_session(account)
+        account.idle_memory.stop()
+        account.layout.drain_popup_pool()
+        self.accounts.pop(account.name, None)
+        if self.account is account:
+            self.account = next(iter(self.accounts.values()), None)
+
+    def present_account(self, account):
+        window = account.layout.window
+        if window.get_application() is None:
+            resources.create_dirs()
+            account.create_dirs()
+            window.set_application(self)
+            GLib.idle_add(self.on_startup_maintenance, account)
+        elif account.resume_uri:
+            self.resume(account)
+        self.account = account
+        window.present()
 
     def do_activate(self):
-        resources.create_dirs()
-        self.layout.window.set_application(self)
-        self.layout.window.present()
-        self.layout.webview.load_uri(self.home_uri)
+        account = self.accounts.get(None) or self.create_account(None)
+        self.present_account(account)
+
+    @property
+    def resident(self):
+        return bool(self.options.resident or self.settings.resident)
+
+    def on_window_delete(self, account, window, event):
+        if account.layout.webview and account.name is None and self.resident:
+            self.suspend(account)
+            return True
+        self.close_account(account)
+        return False
+
+    def suspend(self, account):
+        layout = account.layout
+        webview = layout.webview
+        account.resume_uri = webview.get_uri() or self.home_uri
+        layout.window.hide()
+        self.update_background(account)
+        layout.drain_popup_pool()
+        webview.load_uri(self.blank_uri)
+        GLib.timeout_add_seconds(1, self.on_suspended)
+
+    def on_suspended(self):
+        release_memory()
+        return False
+
+    def resume(self, account):
+        uri = account.resume_uri
+        account.resume_uri = None
+        account.layout.webview.load_uri(uri)
+        account.layout.schedule_popup_pool()
+
+    def on_resident_toggle(self, widget):
+        value = widget.get_active()
+        if value != self.settings.resident:
+            self.settings.resident = value
+            self.settings.save()
+
+    def on_window_draw(self, window, cr):
+        self.startup.mark('window')
+        window.disconnect_by_func(self.on_window_draw)
+
+    def get_maintenance_time(self, account):
+        if account.name is None:
+            return self.settings.storage_maintenance
+        return (self.settings.account_maintenance or {}).get(account.name)
+
+    def set_maintenance_time(self, account, value):
+        if account.name is None:
+            self.settings.storage_maintenance = value
+        else:
+            runs = dict(self.settings.account_maintenance or ())
+            runs[account.name] = value
+            self.settings.account_maintenance = runs
+        self.settings.save()
+
+    def on_startup_maintenance(self, account):
+        maintenance = StorageMaintenance(account.storage)
+        if maintenance.due(self.get_maintenance_time(account)):
+            maintenance.run(
+                functools.partial(self.on_storage_maintained, account)
+                )
+        else:
+            GLib.idle_add(self.on_startup_webview, account)
+        return False
+
+    def on_storage_maintained(self, account, report):
+        # locked or unreadable databases are retried on next startup
+        if not report.error:
+            if report.integrity != 'ok':
+                logger.warning(
+                    'cookie storage integrity check failed for %s account: %s',
+                    account.label,
+                    report.integrity
+                    )
+            self.set_maintenance_time(account, time.time())
+        self.startup.mark('maintenance')
+        return self.on_startup_webview(account)
+
+    def on_startup_webview(self, account):
+        layout = account.layout
+        layout.create_webview()
+        self.check_plugins(account)
+        bind = functools.partial
+        layout.connect({
+            'webview.create': bind(self.on_create_request, account),
+            'webview.decide-policy': bind(self.on_decide_policy, account),
+            'webview.load-changed': bind(self.on_load_change, account),
+            'webview.resource-load-started': self.warmup.on_resource_load,
+            'webview.mouse-target-changed': self.warmup.on_mouse_target,
+            })
+        layout.connect({
+            'webview.resource-load-started': self.timeline.on_resource_load,
+            })
+        self.startup.mark('webview')
+        GLib.idle_add(self.on_startup_load, account)
+        return False
+
+    def on_startup_load(self, account):
+        webview = account.layout.webview
+        self.warmup.start(webview.get_context(), self.home_uri)
+        if not (
+          self.options.restore_session and
+          account.session.restore(webview, self.is_restorable)
+          ):
+            webview.load_uri(self.home_uri)
+        if self.session_timer is None:
+            self.session_timer = GLib.timeout_add_seconds(
+                self.session_save_interval,
+                self.on_session_timeout
+                )
+        return False
+
+    def is_restorable(self, uri):
+        return uri != self.blank_uri and (
+            self.options.unrestricted or
+            self.policy.decide(uri) == ACCEPT
+            )
+
+    def save_session(self, account):
+        webview = account.layout.webview
+        if webview is not None:
+            account.session.save(webview, account.resume_uri)
+
+    def on_session_timeout(self):
+        for account in self.accounts.values():
+            self.save_session(account)
+        return True
+
+    def do_handle_local_options(self, options):
+        if options.contains('profile'):
+            Layout.profiler = self.profiler
+        return -1
 
     def do_command_line(self, command_line):
         options = command_line.get_options_dict()
-        self.options.unrestricted = options.contains('--unrestricted')
-        self.activate()
+        self.options.unrestricted = options.contains('unrestricted')
+        self.options.restore_session = not options.contains('home-uri')
+        self.options.resident = (
+            self.options.resident or options.contains('resident')
+            )
+        if options.contains('startup-timing'):
+            self.startup.enable()
+        if options.contains('performance-profile'):
+            self.set_performance_profile(
+                self.lookup_option(options, 'performance-profile')
+                )
+        if options.contains('home-uri'):
+            self.home_uri = self.lookup_option(options, 'home-uri')
+        if options.contains('policy'):
+            self.load_policy(self.lookup_option(options, 'policy'))
+        if options.contains('profile') and Layout.profiler:
+            if command_line.get_is_remote():
+                self.dump_profile(command_line)
+            else:
+                self.profiler.start()
+        if options.contains('account'):
+            name = self.lookup_option(options, 'account')
+            try:
+                account = self.accounts.get(name) or self.create_account(name)
+            except ValueError as e:
+                if not self.print_remote(command_line, e, error=True):
+                    logger.error('%s', e)
+                return 1
+            self.present_account(account)
+        else:
+            self.activate()
         return 0
 
+    def lookup_option(self, options, name):
+        return options.lookup_value(name, GLib.VariantType('s')).get_string()
+
+    def do_shutdown(self):
+        if self.profiler.running:
+            self.dump_profile()
+        for account in self.accounts.values():
+            self.save_session(account)
+        if self.warmup:
+            self.warmup.save()
+            logger.info(
+                'dns warm-up: %(hits)d hits out of %(prefetched)d prefetches',
+                self.warmup.stats
+                )
+        if self.playback:
+            summary = self.playback.save()
+            if summary:
+                logger.info(
+                    'playback: %(dropped)d of %(decoded)d frames dropped, '
+                    '%(stalls)d stalls (%(stalled).1f s)',
+                    summary
+                    )
+        Gtk.Application.do_shutdown(self)
+
+    def on_export_har(self, action, param):
+        dialog = Gtk.FileChooserNative.new(
+            'Export Network Log',
+            self.layout.window,
+            Gtk.FileChooserAction.SAVE,
+            None,
+            None
+            )
+        dialog.set_do_overwrite_confirmation(True)
+        dialog.set_current_name(
+            time.strftime('{}-%Y%m%d-%H%M%S.har'.format(meta.__app__))
+            )
+        if dialog.run() == Gtk.ResponseType.ACCEPT:
+            path = dialog.get_filename()
+            try:
+                self.timeline.export(path)
+            except OSError as e:
+                logger.error('cannot export %s: %s', path, e)
+        dialog.destroy()
+
+    def on_dump_profile(self, action, param):
+        self.dump_profile()
+
+    def dump_profile(self, command_line=None):
+        '''
+        Print profile on the invoking terminal, or log it.
+        '''
+        report = self.profiler.dump()
+        if not (command_line and self.print_remote(command_line, report)):
+            logger.info('signal profile:\n%s', report)
+
+    def print_remote(self, command_line, message, error=False):
+        '''
+        Print message on the invoking terminal, returns False if unable.
+
+        ApplicationCommandLine print and printerr are variadic, so not
+        introspectable, and their literal variants need GLib 2.80.
+        '''
+        name = 'printerr_literal' if error else 'print_literal'
+        method = getattr(command_line, name, None)
+        if method is None:
+            return False
+        method('%s\n' % message)
+        return True
+
     def on_quit(self, action, param):
         self.quit()
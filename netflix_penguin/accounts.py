@@ -0,0 +1,49 @@
+
+import os
+import os.path
+import re
+
+from . import resources
+from .session import SessionStore
+
+
+class Account(object):
+    '''
+    Browsing account, with its own cookie storage and website data
+    directories, and the state of its browser window.
+
+    The default (unnamed) account uses the top-level application dirs.
+    '''
+    re_name = re.compile(r'^\w[\w.-]*$')
+
+    def __init__(self, name=None):
+        if name is None:
+            self.cache_dir = resources.cache_dir
+            self.data_dir = resources.data_dir
+            self.storage = resources.storage
+            session = resources.session
+        elif self.re_name.match(name):
+            self.cache_dir = os.path.join(resources.accounts_cache_dir, name)
+            self.data_dir = os.path.join(resources.accounts_data_dir, name)
+            self.storage = os.path.join(self.data_dir, 'storage')
+            session = os.path.join(self.data_dir, 'session.json')
+        else:
+            raise ValueError('invalid account name %r' % name)
+        self.name = name
+        self.session = SessionStore(session)
+        self.layout = None
+        self.idle_memory = None
+        self.data_usage = None
+        self.data_cleaner = None
+        self.resume_uri = None
+        self.fullscreen = False
+        self.iconified = False
+
+    @property
+    def label(self):
+        return self.name or 'default'
+
+    def create_dirs(self):
+        for dirname in [self.cache_dir, self.data_dir]:
+            if not os.path.exists(dirname):
+                os.makedirs(dirname)
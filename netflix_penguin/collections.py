@@ -8,3 +8,20 @@ class AttrDefaultDict(collections.defaultdict):
 
     def __setattr__(self, name, value):
         self[name] = value
+
+
+class LRUCache(collections.OrderedDict):
+    def __init__(self, maxsize=128):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key):
+        value = super(LRUCache, self).__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super(LRUCache, self).__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
@@ -0,0 +1,92 @@
+
+import re
+import json
+import hashlib
+import logging
+import collections
+import urllib.parse
+
+from .gi import GLib, WebKit2
+
+logger = logging.getLogger(__name__)
+
+
+class ContentFilter(object):
+    '''
+    Request blocking rule set in WebKit content blocker format, compiled
+    into a UserContentFilterStore only when the rules change.
+
+    WebKit does not report blocked requests, so once the filter is
+    installed, failed resources whose uri matches a block rule are counted
+    as such. Compilation errors are kept in `error`.
+    '''
+    identifier_prefix = 'rules-'
+
+    def __init__(self, path, store_path):
+        with open(path, 'rb') as f:
+            self.source = f.read()
+        self.store_path = store_path
+        self.identifier = '%s%s' % (
+            self.identifier_prefix,
+            hashlib.sha1(self.source).hexdigest()
+            )
+        self.patterns = [
+            re.compile(rule['trigger']['url-filter'])
+            for rule in json.loads(self.source.decode('utf-8'))
+            if rule['action']['type'] == 'block'
+            ]
+        self.blocked = 0
+        self.hosts = collections.Counter()
+        self.store = None
+        self.installed = False
+        self.error = None
+
+    def install(self, manager):
+        self.store = WebKit2.UserContentFilterStore.new(self.store_path)
+        self.store.load(self.identifier, None, self.on_load, manager)
+
+    def on_load(self, store, result, manager):
+        try:
+            content_filter = store.load_finish(result)
+        except GLib.Error:
+            logger.info('compiling content filter %s', self.identifier)
+            store.save(
+                self.identifier,
+                GLib.Bytes.new(self.source),
+                None,
+                self.on_save,
+                manager
+                )
+            return
+        self.add(manager, content_filter)
+
+    def on_save(self, store, result, manager):
+        try:
+            content_filter = store.save_finish(result)
+        except GLib.Error as e:
+            logger.error('cannot compile content filter: %s', e.message)
+            self.error = e.message
+            return
+        self.add(manager, content_filter)
+        store.fetch_identifiers(None, self.on_identifiers)
+
+    def add(self, manager, content_filter):
+        manager.add_filter(content_filter)
+        self.installed = True
+
+    def on_identifiers(self, store, result):
+        for identifier in store.fetch_identifiers_finish(result):
+            if identifier != self.identifier:
+                store.remove(identifier, None, None)
+
+    def match(self, uri):
+        return any(pattern.search(uri) for pattern in self.patterns)
+
+    def on_resource_load(self, webview, resource, request):
+        resource.connect('failed', self.on_resource_failed)
+
+    def on_resource_failed(self, resource, error):
+        uri = resource.get_uri()
+        if self.installed and self.match(uri):
+            self.blocked += 1
+            self.hosts[urllib.parse.urlsplit(uri).hostname] += 1
@@ -1,10 +1,29 @@
 
 from __future__ import absolute_import
 
+import importlib
+
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('WebKit2', '4.0')
 
-from gi.repository import Gtk, Gdk, Gio, WebKit2, GObject  # noqa
+from gi.repository import Gtk, Gdk, Gio, GLib, GObject  # noqa
+
+
+class LazyModule(object):
+    '''
+    Module proxy, deferring the actual import until first attribute access.
+    '''
+    def __init__(self, name):
+        self.__dict__['__name__'] = name
+
+    def __getattr__(self, name):
+        module = importlib.import_module(self.__name__)
+        value = getattr(module, name)
+        self.__dict__[name] = value
+        return value
+
+
+WebKit2 = LazyModule('gi.repository.WebKit2')
 
-__all__ = (Gtk, Gdk, Gio, WebKit2, GObject)
+__all__ = (Gtk, Gdk, Gio, GLib, WebKit2, GObject)
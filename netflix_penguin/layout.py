@@ -1,18 +1,164 @@
 
+import time
+import logging
+import collections
+import xml.etree.ElementTree as ElementTree
+
+from . import performance
 from .collections import AttrDefaultDict
-from .gi import Gtk, WebKit2
+from .userscripts import UserScriptRegistry
+from .gi import Gtk, Gio, GLib, WebKit2
+
+logger = logging.getLogger(__name__)
+
+
+class Template(object):
+    '''
+    In-memory builder definition, parsed once per path and shared by every
+    layout using it, indexing which toplevel object every object id lives in.
+
+    Toplevel dependencies are taken from object-reference properties only,
+    as any other property value could match an object id by accident.
+    '''
+    cache = {}
+    resource_scheme = 'resource://'
+    reference_properties = frozenset((
+        'adjustment', 'hadjustment', 'vadjustment', 'image', 'model',
+        'buffer', 'transient_for', 'attached_to', 'mnemonic_widget',
+        'popover', 'relative_to', 'menu_model', 'stack', 'custom_title',
+        'label_widget', 'icon_widget', 'submenu',
+        ))
+
+    @classmethod
+    def get(cls, path):
+        template = cls.cache.get(path)
+        if template is None:
+            template = cls.cache[path] = cls(path)
+        return template
+
+    def __init__(self, path):
+        start = time.perf_counter()
+        self.path = path
+        self.buffer = self.load(path)
+        self.toplevels = collections.OrderedDict()
+        self.requires = {}
+        self.timings = collections.deque(maxlen=64)
+
+        root = ElementTree.fromstring(self.buffer)
+        elements = [
+            element
+            for element in root.findall('object')
+            if element.get('id')
+            ]
+        for element in elements:
+            toplevel = element.get('id')
+            for child in element.iter('object'):
+                if child.get('id'):
+                    self.toplevels[child.get('id')] = toplevel
+        for element in elements:
+            toplevel = element.get('id')
+            self.requires[toplevel] = [
+                self.toplevels[prop.text]
+                for prop in element.iter('property')
+                if self.is_reference(prop) and
+                self.toplevels.get(prop.text, toplevel) != toplevel
+                ]
+        self.record(('<parse>',), time.perf_counter() - start)
+
+    def is_reference(self, prop):
+        name = prop.get('name', '').replace('-', '_')
+        return name in self.reference_properties
+
+    def load(self, path):
+        if path.startswith(self.resource_scheme):
+            data = Gio.resources_lookup_data(
+                path[len(self.resource_scheme):],
+                Gio.ResourceLookupFlags.NONE
+                )
+            return data.get_data().decode('utf-8')
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def resolve(self, ids):
+        '''
+        Get toplevel object ids required to build given object ids, in build
+        order (dependencies first).
+        '''
+        resolved = []
+        pending = [self.toplevels[i] for i in reversed(ids)]
+        while pending:
+            toplevel = pending[-1]
+            missing = [
+                required
+                for required in self.requires[toplevel]
+                if required not in resolved and required not in pending
+                ]
+            if missing:
+                pending.extend(missing)
+                continue
+            pending.pop()
+            if toplevel not in resolved:
+                resolved.append(toplevel)
+        return resolved
+
+    def record(self, toplevels, elapsed):
+        self.timings.append((tuple(toplevels), elapsed))
+        logger.debug(
+            'built %s from %s in %.2f ms',
+            ', '.join(toplevels), self.path, elapsed * 1000
+            )
 
 
 class Layout(AttrDefaultDict):
+    template_class = Template
+    profiler = None
+
     def __init__(self, path):
         self.path = path
-        self.builder = Gtk.Builder.new_from_file(path)
+        self.template = self.template_class.get(path)
+        self.builder = Gtk.Builder()
+        self.built = set()
+        self.deferred = []
         super(Layout, self).__init__()
 
+    def build(self, ids):
+        toplevels = [
+            toplevel
+            for toplevel in self.template.resolve(ids)
+            if toplevel not in self.built
+            ]
+        if not toplevels:
+            return
+        start = time.perf_counter()
+        if self.built or len(toplevels) < len(self.template.requires):
+            self.builder.add_objects_from_string(
+                self.template.buffer,
+                toplevels
+                )
+        else:
+            self.builder.add_from_string(self.template.buffer)
+        self.built.update(toplevels)
+        self.template.record(toplevels, time.perf_counter() - start)
+
+        deferred = self.deferred
+        self.deferred = []
+        for widget, signal, handler in deferred:
+            self.connect_signal(widget, signal, handler)
+
     def connect(self, signals):
         for spec, handler in signals.items():
             widget, signal = spec.split('.', 1)
+            self.connect_signal(widget, signal, handler)
+
+    def connect_signal(self, widget, signal, handler):
+        toplevel = self.template.toplevels.get(widget)
+        if toplevel is None or toplevel in self.built:
+            if self.profiler:
+                spec = '%s.%s' % (widget, signal)
+                handler = self.profiler.wrap(spec, handler)
             self[widget].connect(signal, handler)
+        else:
+            self.deferred.append((widget, signal, handler))
 
     def set(self, properties):
         for spec, value in properties.items():
@@ -21,33 +167,66 @@ class Layout(AttrDefaultDict):
             getattr(self[widget], setter)(value)
 
     def __missing__(self, key):
+        if key in self.template.toplevels:
+            self.build((key,))
         return self.builder.get_object(key)
 
 
 class PopUpLayout(Layout):
-    def __init__(self, path, parent):
+    def __init__(self, path, parent, recycle=None):
         super(PopUpLayout, self).__init__(path)
 
-        self.popup.set_properties({
-            'visible': True,
-            })
+        self.parent = parent
+        self.recycle = recycle
+        self.webview = None
         self.popup.set_transient_for(parent.get_toplevel())
-
-        webview = WebKit2.WebView.new_with_related_view(parent)
-
-        self.webview = webview
-        self.popup.add(webview)
         self.connect({
+            'popup.delete-event': self.on_delete,
             'popup_back_button.clicked': lambda b: self.webview.go_back(),
             'popup_forw_button.clicked': lambda b: self.webview.go_forward(),
             'popup_reload_button.clicked': lambda b: self.webview.reload(),
+            })
+        self.attach()
+
+    def attach(self):
+        webview = WebKit2.WebView.new_with_related_view(self.parent)
+        self.webview = webview
+        self.popup.add(webview)
+        self.connect({
             'webview.ready-to-show': lambda source: source.show(),
             'webview.load-changed': self.on_load_change,
             'webview.notify::title': self.on_title_change,
             'webview.notify::uri': self.on_uri_change,
-            'webview.close': lambda source: self.popup.destroy(),
+            'webview.close': self.on_close,
+            })
+
+    def detach(self):
+        self.popup.hide()
+        self.popup.set_application(None)
+        self.popup.remove(self.webview)
+        self.webview.destroy()
+        self.webview = None
+        self.popup_header.set_title(None)
+        self.popup_header.set_subtitle(None)
+        self.set({
+            'popup_back_button.sensitive': False,
+            'popup_forw_button.sensitive': False,
+            'popup_reload_button.sensitive': False,
             })
 
+    def on_close(self, webview):
+        if self.recycle:
+            self.detach()
+            self.recycle(self)
+        else:
+            self.popup.destroy()
+
+    def on_delete(self, popup, event):
+        if self.recycle:
+            self.on_close(self.webview)
+            return True
+        return False
+
     def on_title_change(self, webview, param):
         title = webview.get_title()
         self.popup_header.set_title(title)
@@ -60,7 +239,7 @@ class PopUpLayout(Layout):
         if event == WebKit2.LoadEvent.STARTED:
             self.popup_reload_button.set_property('sensitive', False)
         elif event == WebKit2.LoadEvent.COMMITTED:
-            self.layout.set({
+            self.set({
                 'popup_back_button.sensitive': self.webview.can_go_back(),
                 'popup_forw_button.sensitive': self.webview.can_go_forward(),
                 })
@@ -72,11 +251,13 @@ class PopUpLayout(Layout):
 
 class BrowserLayout(Layout):
     popup_layout_class = PopUpLayout
+    default_popup_pool_size = 1
     userAgent = (
         'Mozilla/5.0 (Windows NT 6.3; rv:36.0) '
         'Gecko/20100101 Firefox/36.04'
         )
     platform = "Win32"
+    script_origins = ('*://*.netflix.com/*',)
     script = '''
         (() => {
             const navigator = window.navigator;
@@ -121,21 +302,80 @@ class BrowserLayout(Layout):
             'platform': platform
             }
 
-    def __init__(self, path, cookie_storage_path):
+    def __init__(self, path, cookie_storage_path, cache_dir=None,
+                 data_dir=None, popup_pool_size=None,
+                 performance_profile=performance.DEFAULT,
+                 content_filter=None, playback_monitor=None):
         super(BrowserLayout, self).__init__(path)
 
-        manager = WebKit2.UserContentManager()
-        manager.add_script(WebKit2.UserScript(
+        self.popup_pool = collections.deque()
+        self.popup_spares = []
+        self.popup_stats = collections.Counter(hits=0, misses=0)
+        self.popup_refill = None
+        # instance values are dict keys, so they cannot override class ones
+        self.popup_pool_size = (
+            self.default_popup_pool_size
+            if popup_pool_size is None else
+            popup_pool_size
+            )
+
+        self.cookie_storage_path = cookie_storage_path
+        self.cache_dir = cache_dir
+        self.data_dir = data_dir
+        self.performance_profile = performance_profile
+        self.content_filter = content_filter
+        self.playback_monitor = playback_monitor
+        self.website_data_manager = None
+        self.user_scripts = UserScriptRegistry()
+        self.user_scripts.add(
+            'navigator',
             self.script,
-            WebKit2.UserContentInjectedFrames.ALL_FRAMES,
-            WebKit2.UserScriptInjectionTime.START
-        ))
-        webview = WebKit2.WebView.new_with_user_content_manager(manager)
-        context = webview.get_context()
-        context.get_plugins(None, self.on_plugins)
+            allow=self.script_origins,
+            )
+        if playback_monitor:
+            self.user_scripts.add(
+                playback_monitor.handler_name,
+                playback_monitor.script,
+                allow=self.script_origins,
+                )
+        self.webview = None
+        self.connect({
+            'fullscreen_button.clicked': lambda b: self.window.fullscreen(),
+            'hover_unfullscreen_button.clicked': (
+                lambda b: self.window.unfullscreen()
+                ),
+            })
+
+    def create_context(self):
+        if not (self.cache_dir or self.data_dir):
+            return WebKit2.WebContext.get_default()
+        manager = WebKit2.WebsiteDataManager(
+            base_cache_directory=self.cache_dir,
+            base_data_directory=self.data_dir,
+            )
+        return WebKit2.WebContext.new_with_website_data_manager(manager)
+
+    def create_webview(self):
+        manager = WebKit2.UserContentManager()
+        self.user_scripts.install(manager)
+        if self.playback_monitor:
+            self.playback_monitor.install(manager, self.on_playback_sample)
+        if self.content_filter:
+            self.content_filter.install(manager)
+        context = self.create_context()
+        self.website_data_manager = context.get_website_data_manager()
+        performance.apply_context(
+            context,
+            self.performance_profile,
+            startup=True
+            )
+        webview = WebKit2.WebView(
+            web_context=context,
+            user_content_manager=manager
+            )
         cookies = context.get_cookie_manager()
         cookies.set_persistent_storage(
-            cookie_storage_path,
+            self.cookie_storage_path,
             WebKit2.CookiePersistentStorage.SQLITE
             )
         settings = webview.get_settings()
@@ -146,11 +386,11 @@ class BrowserLayout(Layout):
             'enable-fullscreen': True,
             'enable-page-cache': True,
             })
+        performance.apply_settings(settings, self.performance_profile)
         webview.set_settings(settings)
         webview.show()
         self.webview = webview
-        self.main.pack_start(webview, True, True, 0)
-        w = self.window
+        self.view.add(webview)
         self.connect({
             'back_button.clicked': lambda b: webview.go_back(),
             'hover_back_button.clicked': lambda b: webview.go_back(),
@@ -158,10 +398,16 @@ class BrowserLayout(Layout):
             'hover_forw_button.clicked': lambda b: webview.go_forward(),
             'reload_button.clicked': lambda b: webview.reload(),
             'hover_reload_button.clicked': lambda b: webview.reload(),
-            'fullscreen_button.clicked': lambda b: w.fullscreen(),
-            'hover_unfullscreen_button.clicked': lambda b: w.unfullscreen(),
             'webview.notify::title': self.on_title_change,
             })
+        if self.content_filter:
+            self.connect({
+                'webview.resource-load-started': (
+                    self.content_filter.on_resource_load
+                    ),
+                })
+        self.schedule_popup_pool()
+        return webview
 
     def on_title_change(self, webview, param):
         title = webview.get_title()
@@ -169,5 +415,76 @@ class BrowserLayout(Layout):
         self.headerbar.set_subtitle(title)
         self.hover_headerbar.set_subtitle(title)
 
+    def on_playback_sample(self, sample):
+        if self.playback_label.get_visible():
+            self.playback_label.set_label(self.playback_monitor.format(sample))
+
+    def toggle_playback_overlay(self):
+        visible = not self.playback_label.get_visible()
+        self.playback_label.set_visible(visible)
+        if visible:
+            self.playback_label.set_label('No playback data yet')
+
+    def set_performance_profile(self, name):
+        self.performance_profile = name
+        if self.webview:
+            performance.apply_context(self.webview.get_context(), name)
+            performance.apply_settings(self.webview.get_settings(), name)
+
+    def new_popup(self):
+        return self.popup_layout_class(
+            self.path,
+            self.webview,
+            recycle=self.recycle_popup,
+            )
+
     def create_popup(self):
-        return self.popup_layout_class(self.path, self.webview)
+        if self.popup_pool:
+            layout = self.popup_pool.popleft()
+            self.popup_stats['hits'] += 1
+        else:
+            layout = self.new_popup()
+            self.popup_stats['misses'] += 1
+        logger.debug(
+            'popup pool: %(hits)d hits, %(misses)d misses',
+            self.popup_stats
+            )
+        self.schedule_popup_pool()
+        return layout
+
+    def recycle_popup(self, layout):
+        pooled = len(self.popup_pool) + len(self.popup_spares)
+        if pooled < self.popup_pool_size:
+            self.popup_spares.append(layout)
+            self.schedule_popup_pool()
+        else:
+            layout.popup.destroy()
+
+    def schedule_popup_pool(self):
+        if self.popup_refill is None and self.popup_pool_size:
+            self.popup_refill = GLib.idle_add(
+                self.fill_popup_pool,
+                priority=GLib.PRIORITY_LOW
+                )
+
+    def drain_popup_pool(self):
+        while self.popup_pool:
+            self.popup_pool.pop().popup.destroy()
+        while self.popup_spares:
+            self.popup_spares.pop().popup.destroy()
+        if self.popup_refill is not None:
+            GLib.source_remove(self.popup_refill)
+            self.popup_refill = None
+
+    def fill_popup_pool(self):
+        if len(self.popup_pool) < self.popup_pool_size:
+            if self.popup_spares:
+                layout = self.popup_spares.pop()
+                layout.attach()
+            else:
+                layout = self.new_popup()
+            self.popup_pool.append(layout)
+        if len(self.popup_pool) < self.popup_pool_size:
+            return True
+        self.popup_refill = None
+        return False
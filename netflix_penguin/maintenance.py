@@ -0,0 +1,94 @@
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+import contextlib
+import collections
+
+from .gi import GLib
+
+logger = logging.getLogger(__name__)
+
+Report = collections.namedtuple(
+    'Report',
+    ('integrity', 'before', 'after', 'error')
+    )
+
+
+class StorageMaintenance(object):
+    '''
+    SQLite database compaction and integrity check, meant to run before
+    WebKit attaches the database, as its network process keeps it open
+    (and writable) until exit.
+    '''
+    interval = 7 * 24 * 3600
+    freelist_ratio = .2
+
+    def __init__(self, path):
+        self.path = path
+
+    def due(self, last_run):
+        if not os.path.isfile(self.path):
+            return False
+        if not last_run or time.time() - last_run > self.interval:
+            return True
+        try:
+            with self.connect() as db:
+                free = db.execute('PRAGMA freelist_count').fetchone()[0]
+                total = db.execute('PRAGMA page_count').fetchone()[0]
+        except sqlite3.Error:
+            return True
+        return total and free / total > self.freelist_ratio
+
+    @contextlib.contextmanager
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def run(self, callback):
+        '''
+        Start maintenance on a worker thread, `callback(report)` will be
+        called on main loop, even if maintenance fails.
+        '''
+        thread = threading.Thread(
+            target=self.run_thread,
+            args=(callback,),
+            name='StorageMaintenance',
+            daemon=True,
+            )
+        thread.start()
+
+    def run_thread(self, callback):
+        try:
+            report = self.maintain()
+        except Exception as e:
+            logger.exception('cannot maintain %s', self.path)
+            report = Report(None, None, None, str(e))
+        GLib.idle_add(callback, report)
+
+    def maintain(self):
+        '''
+        Check and compact database, reporting an `error` instead (and no
+        integrity) if it could not be done, like when it is locked.
+        '''
+        before = os.path.getsize(self.path)
+        integrity = None
+        try:
+            with self.connect() as db:
+                integrity = db.execute('PRAGMA integrity_check').fetchone()[0]
+                if integrity == 'ok':
+                    db.execute('VACUUM')
+        except sqlite3.Error as e:
+            logger.warning('skipped maintenance of %s: %s', self.path, e)
+            return Report(None, before, before, str(e))
+        report = Report(integrity, before, os.path.getsize(self.path), None)
+        logger.info(
+            'maintained %s: integrity %s, %d bytes before, %d after',
+            self.path, *report[:3]
+            )
+        return report
@@ -0,0 +1,103 @@
+
+import os
+import logging
+
+from .gi import GLib
+from .utils import human_size, release_memory
+
+logger = logging.getLogger(__name__)
+
+
+def process_tree(pid='self'):
+    '''
+    Get given process id along with all its descendants (ie. WebKit ones).
+    '''
+    pids = [str(os.getpid()) if pid == 'self' else str(pid)]
+    for current in pids:
+        try:
+            for task in os.listdir('/proc/%s/task' % current):
+                with open('/proc/%s/task/%s/children' % (current, task)) as f:
+                    pids.extend(f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def rss(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open('/proc/%s/status' % pid) as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except (OSError, ValueError, IndexError):
+            pass
+    return total
+
+
+class IdleMemoryPolicy(object):
+    '''
+    Releases memory after the window stays minimized or unfocused for
+    `delay` seconds with no media playing, purging the page cache and, if
+    the window is not on screen, hiding the webview so WebKit throttles it.
+    '''
+    report_delay = 5
+
+    def __init__(self, layout, delay, is_playing):
+        self.layout = layout
+        self.delay = delay
+        self.is_playing = is_playing
+        self.timeout = None
+        self.released = False
+        self.obscured = False
+
+    def update(self, background, obscured=False):
+        self.obscured = obscured
+        if background and not self.released and self.delay:
+            if self.timeout is None:
+                self.timeout = GLib.timeout_add_seconds(
+                    self.delay,
+                    self.on_timeout
+                    )
+        elif not background:
+            self.stop()
+            if self.released:
+                self.restore()
+
+    def stop(self):
+        if self.timeout is not None:
+            GLib.source_remove(self.timeout)
+            self.timeout = None
+
+    def on_timeout(self):
+        webview = self.layout.webview
+        if webview is None or self.is_playing():
+            return True
+        self.timeout = None
+        self.release()
+        return False
+
+    def release(self):
+        webview = self.layout.webview
+        before = rss(process_tree())
+        self.released = True
+        if self.obscured:
+            webview.hide()
+        webview.get_settings().set_property('enable-page-cache', False)
+        release_memory()
+        GLib.timeout_add_seconds(self.report_delay, self.on_report, before)
+
+    def on_report(self, before):
+        after = rss(process_tree())
+        logger.info(
+            'idle memory release: rss %s before, %s after',
+            human_size(before), human_size(after)
+            )
+        return False
+
+    def restore(self):
+        self.released = False
+        self.layout.set_performance_profile(self.layout.performance_profile)
+        self.layout.webview.show()
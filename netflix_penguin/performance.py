@@ -0,0 +1,75 @@
+
+import collections
+
+from .gi import WebKit2
+
+DEFAULT = 'balanced'
+
+profiles = collections.OrderedDict([
+    ('low-memory', {
+        'label': 'Low memory',
+        'cache-model': 'DOCUMENT_VIEWER',
+        'process-model': 'SHARED_SECONDARY_PROCESS',
+        'settings': {
+            'enable-page-cache': False,
+            'enable-webgl': False,
+            'enable-accelerated-2d-canvas': False,
+            'enable-smooth-scrolling': False,
+            'hardware-acceleration-policy': 'NEVER',
+            },
+        }),
+    ('balanced', {
+        'label': 'Balanced',
+        'cache-model': 'WEB_BROWSER',
+        'process-model': 'SHARED_SECONDARY_PROCESS',
+        'settings': {
+            'enable-page-cache': True,
+            'enable-webgl': False,
+            'enable-accelerated-2d-canvas': False,
+            'enable-smooth-scrolling': True,
+            'hardware-acceleration-policy': 'ON_DEMAND',
+            },
+        }),
+    ('maximum-throughput', {
+        'label': 'Maximum throughput',
+        'cache-model': 'WEB_BROWSER',
+        'process-model': 'MULTIPLE_SECONDARY_PROCESSES',
+        'settings': {
+            'enable-page-cache': True,
+            'enable-webgl': True,
+            'enable-accelerated-2d-canvas': True,
+            'enable-smooth-scrolling': True,
+            'hardware-acceleration-policy': 'ALWAYS',
+            },
+        }),
+    ])
+
+enums = {
+    'hardware-acceleration-policy': 'HardwareAccelerationPolicy',
+    }
+
+
+def get(name):
+    return profiles.get(name) or profiles[DEFAULT]
+
+
+def apply_context(context, name, startup=False):
+    '''
+    Apply profile to a web context, process model is only applied on
+    `startup` as it cannot change once a web process has been spawned.
+    '''
+    profile = get(name)
+    context.set_cache_model(
+        getattr(WebKit2.CacheModel, profile['cache-model'])
+        )
+    if startup:
+        context.set_process_model(
+            getattr(WebKit2.ProcessModel, profile['process-model'])
+            )
+
+
+def apply_settings(settings, name):
+    for prop, value in get(name)['settings'].items():
+        if prop in enums:
+            value = getattr(getattr(WebKit2, enums[prop]), value)
+        settings.set_property(prop, value)
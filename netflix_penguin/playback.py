@@ -0,0 +1,165 @@
+
+import os
+import json
+import time
+import logging
+import collections
+
+from .gi import GLib
+
+logger = logging.getLogger(__name__)
+
+
+class PlaybackMonitor(object):
+    '''
+    Video playback quality sampler, fed through a script message channel
+    by a user script polling the page `<video>` element while on `/watch`
+    pages, keeping recent samples in a ring buffer and session totals.
+    '''
+    handler_name = 'playback'
+    sample_interval = 1
+    max_samples = 600
+    counters = ('decoded', 'dropped', 'stalls', 'stalled')
+    script = '''
+        (() => {
+            let video = null;
+            let stalls = 0;
+            let stalled = 0;
+            let stallStart = null;
+            const onWaiting = () => {
+                if (stallStart === null) {
+                    stalls++;
+                    stallStart = performance.now();
+                }
+            };
+            const onPlaying = () => {
+                if (stallStart !== null) {
+                    stalled += performance.now() - stallStart;
+                    stallStart = null;
+                }
+            };
+            setInterval(() => {
+                if (!location.pathname.startsWith('/watch')) return;
+                const current = document.querySelector('video');
+                if (!current) return;
+                if (current !== video) {
+                    video = current;
+                    stalls = 0;
+                    stalled = 0;
+                    stallStart = null;
+                    video.addEventListener('waiting', onWaiting);
+                    video.addEventListener('playing', onPlaying);
+                }
+                const quality = video.getVideoPlaybackQuality ?
+                    video.getVideoPlaybackQuality() : {};
+                const stalling = stallStart === null ?
+                    0 : performance.now() - stallStart;
+                window.webkit.messageHandlers.%(handler)s.postMessage(
+                    JSON.stringify({
+                        decoded: quality.totalVideoFrames ||
+                            video.webkitDecodedFrameCount || 0,
+                        dropped: quality.droppedVideoFrames ||
+                            video.webkitDroppedFrameCount || 0,
+                        width: video.videoWidth,
+                        height: video.videoHeight,
+                        stalls: stalls,
+                        stalled: (stalled + stalling) / 1000,
+                        paused: video.paused
+                    })
+                );
+            }, %(interval)d);
+        })();
+        '''
+
+    def __init__(self, path):
+        self.path = path
+        self.script = self.script % {
+            'handler': self.handler_name,
+            'interval': self.sample_interval * 1000,
+            }
+        self.samples = collections.deque(maxlen=self.max_samples)
+        self.started = time.time()
+        self.totals = dict.fromkeys(self.counters, 0)
+        self.resolutions = collections.Counter()
+        self.count = 0
+        self.last = {}
+
+    def install(self, manager, callback):
+        '''
+        Register message channel on UserContentManager, calling
+        `callback(sample)` for every sample it receives.
+        '''
+        manager.register_script_message_handler(self.handler_name)
+        manager.connect(
+            'script-message-received::%s' % self.handler_name,
+            self.on_message,
+            callback
+            )
+
+    def on_message(self, manager, result, callback):
+        try:
+            sample = json.loads(result.get_js_value().to_string())
+        except (ValueError, GLib.Error) as e:
+            logger.debug('invalid playback sample: %s', e)
+            return
+        sample['time'] = time.time()
+        self.record(id(manager), sample)
+        callback(sample)
+
+    def record(self, source, sample):
+        '''
+        Add sample to ring buffer and session totals, counters are
+        cumulative per video element so only their increments are added.
+        '''
+        last = self.last.get(source)
+        self.last[source] = sample
+        self.samples.append(sample)
+        self.count += 1
+        if last is None or any(
+          sample[name] < last[name]
+          for name in self.counters
+          ):
+            last = dict.fromkeys(self.counters, 0)
+        for name in self.counters:
+            self.totals[name] += sample[name] - last[name]
+        if not sample['paused']:
+            self.resolutions['%(width)dx%(height)d' % sample] += 1
+
+    @staticmethod
+    def format(sample):
+        decoded = sample['decoded']
+        ratio = sample['dropped'] / decoded if decoded else 0
+        return (
+            '{width}x{height}\n'
+            'dropped {dropped} of {decoded} frames ({ratio:.1%})\n'
+            'stalls {stalls} ({stalled:.1f} s)'
+            ).format(ratio=ratio, **sample)
+
+    def summary(self):
+        decoded = self.totals['decoded']
+        dropped = self.totals['dropped']
+        return {
+            'started': self.started,
+            'duration': time.time() - self.started,
+            'samples': self.count,
+            'dropped_ratio': dropped / decoded if decoded else 0,
+            'resolutions': dict(self.resolutions),
+            **self.totals
+            }
+
+    def save(self):
+        '''
+        Append session summary to the JSON lines file, if anything played.
+        '''
+        if not self.samples:
+            return None
+        summary = self.summary()
+        try:
+            directory = os.path.dirname(self.path)
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('%s\n' % json.dumps(summary, sort_keys=True))
+        except OSError as e:
+            logger.error('cannot save %s: %s', self.path, e)
+        return summary
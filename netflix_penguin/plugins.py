@@ -0,0 +1,80 @@
+
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PluginCache(object):
+    '''
+    Plugin check result cache, keyed on the state of NPAPI plugin
+    directories (mtime and file list), so WebKit plugin scan is only
+    required when plugin setup changes.
+    '''
+    directories = (
+        '~/.mozilla/plugins',
+        '/usr/lib/browser-plugins',
+        '/usr/local/lib/mozilla/plugins',
+        '/usr/lib/firefox/plugins',
+        '/usr/lib64/browser-plugins',
+        '/usr/lib/browser/plugins',
+        '/usr/lib/mozilla/plugins',
+        '/usr/local/netscape/plugins',
+        '/opt/mozilla/plugins',
+        '/usr/lib64/mozilla/plugins',
+        '/usr/lib/nsbrowser/plugins',
+        '/usr/lib64/nsbrowser/plugins',
+        )
+
+    def __init__(self, path):
+        self.path = path
+        self.key = None
+
+    def plugin_directories(self):
+        directories = [os.path.expanduser(path) for path in self.directories]
+        directories.extend(
+            path
+            for path in os.environ.get('MOZ_PLUGIN_PATH', '').split(':')
+            if path
+            )
+        return directories
+
+    def compute_key(self):
+        state = []
+        for path in self.plugin_directories():
+            try:
+                state.append((
+                    path,
+                    os.stat(path).st_mtime_ns,
+                    sorted(os.listdir(path))
+                    ))
+            except OSError:
+                state.append((path, None, None))
+        data = json.dumps(state).encode('utf-8')
+        return hashlib.sha1(data).hexdigest()
+
+    def get(self):
+        '''
+        Get cached result for current plugin setup, or None.
+        '''
+        self.key = self.compute_key()
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data if data.get('key') == self.key else None
+
+    def set(self, plugins, elapsed):
+        data = {
+            'key': self.key or self.compute_key(),
+            'plugins': plugins,
+            'elapsed': elapsed,
+            }
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        except OSError as e:
+            logger.error('cannot save %s: %s', self.path, e)
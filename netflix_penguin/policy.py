@@ -0,0 +1,177 @@
+
+import os
+import re
+import json
+import string
+
+from .collections import LRUCache
+
+ACCEPT = 'accept'
+POPUP = 'popup'
+
+
+def expand(pattern):
+    '''
+    Expand a path pattern into every literal path it matches.
+
+    Supported syntax: `[abc]` character alternatives, `(a|b)` groups and
+    `(a)?` optional groups.
+    '''
+    def parse_alternatives(pos):
+        options, pos = parse_sequence(pos)
+        while pos < len(pattern) and pattern[pos] == '|':
+            more, pos = parse_sequence(pos + 1)
+            options.extend(more)
+        return options, pos
+
+    def parse_sequence(pos):
+        results = ['']
+        while pos < len(pattern) and pattern[pos] not in '|)':
+            char = pattern[pos]
+            if char == '[':
+                end = pattern.index(']', pos)
+                options = list(pattern[pos + 1:end])
+                pos = end + 1
+            elif char == '(':
+                options, pos = parse_alternatives(pos + 1)
+                if pattern[pos:pos + 1] != ')':
+                    raise ValueError('unbalanced group in %r' % pattern)
+                pos += 1
+                if pattern[pos:pos + 1] == '?':
+                    options.append('')
+                    pos += 1
+            else:
+                options = [char]
+                pos += 1
+            results = [
+                prefix + option
+                for prefix in results
+                for option in options
+                ]
+        return results, pos
+
+    results, pos = parse_alternatives(0)
+    if pos != len(pattern):
+        raise ValueError('unbalanced group in %r' % pattern)
+    return results
+
+
+class PathTrie(object):
+    '''
+    Path segment trie, where every inserted path accepts itself and any
+    path continuing it after a `/`, `?` or `#` delimiter.
+    '''
+    re_delimiter = re.compile(r'[/?#]')
+    placeholders = {
+        '{lang}': lambda segment: (
+            len(segment) == 2 and
+            all(char in string.ascii_lowercase for char in segment)
+            ),
+        }
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, path):
+        node = self.root
+        for segment in path.split('/') if path else ():
+            node = node.setdefault(segment, {})
+        node[None] = True
+
+    def split(self, path):
+        match = self.re_delimiter.search(path)
+        if match is None:
+            return path, '', ''
+        index = match.start()
+        return path[:index], path[index], path[index + 1:]
+
+    def match(self, path):
+        node = self.root
+        while None not in node:
+            segment, delimiter, path = self.split(path)
+            child = node.get(segment)
+            if child is None and delimiter == '/':
+                child = next((
+                    node[placeholder]
+                    for placeholder, check in self.placeholders.items()
+                    if placeholder in node and check(segment)
+                    ), None)
+            if child is None:
+                return False
+            if None not in child and delimiter != '/':
+                return False
+            node = child
+        return True
+
+
+class Policy(object):
+    '''
+    Navigation policy compiled from a JSON allowlist, mapping rule names
+    (`accept`, `popup`) to hosts and their allowed path patterns.
+
+    Hosts can be given as `*.domain` to match any single-label subdomain.
+    '''
+    rules = (ACCEPT, POPUP)
+    cache_size = 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.schemes = ()
+        self.hosts = {}
+        self.cache = LRUCache(self.cache_size)
+        self.reload()
+
+    def reload(self):
+        '''
+        Recompile the allowlist if its file changed, returns True if so.
+        '''
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self.mtime:
+            return False
+        with open(self.path, encoding='utf-8') as f:
+            self.compile(json.load(f))
+        self.mtime = mtime
+        return True
+
+    def compile(self, data):
+        hosts = {}
+        for rule in self.rules:
+            for host, patterns in data.get(rule, {}).items():
+                trie = PathTrie()
+                for pattern in patterns:
+                    for path in expand(pattern):
+                        trie.add(path)
+                hosts.setdefault(host, []).append((rule, trie))
+        self.schemes = tuple('%s://' % scheme for scheme in data['schemes'])
+        self.hosts = hosts
+        self.cache.clear()
+
+    def lookup(self, authority):
+        rules = self.hosts.get(authority)
+        if rules is None:
+            label, dot, parent = authority.partition('.')
+            if label and dot:
+                rules = self.hosts.get('*.%s' % parent)
+        return rules or ()
+
+    def decide(self, uri):
+        '''
+        Get the rule name matching given uri, or None.
+        '''
+        try:
+            return self.cache[uri]
+        except KeyError:
+            pass
+        decision = None
+        for scheme in self.schemes:
+            if uri.startswith(scheme):
+                authority, slash, path = uri[len(scheme):].partition('/')
+                if slash:
+                    for rule, trie in self.lookup(authority):
+                        if trie.match(path):
+                            decision = rule
+                            break
+                break
+        self.cache[uri] = decision
+        return decision
@@ -0,0 +1,156 @@
+
+import os
+import time
+import logging
+import functools
+import threading
+import collections
+
+from .gi import GLib
+
+logger = logging.getLogger(__name__)
+
+
+def process_uptime():
+    '''
+    Get seconds elapsed since current process started, or None if unknown.
+    '''
+    try:
+        with open('/proc/self/stat') as f:
+            fields = f.read().rpartition(')')[2].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer(object):
+    '''
+    Startup milestone recorder, measuring from process start when possible.
+    '''
+    def __init__(self):
+        now = time.perf_counter()
+        self.origin = now - max(process_uptime() or 0, 0)
+        self.marks = collections.OrderedDict()
+        self.durations = collections.OrderedDict()
+        self.enabled = False
+
+    def enable(self):
+        self.enabled = True
+        for name in self.marks:
+            self.report(name)
+        for name in self.durations:
+            self.report_duration(name)
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.origin
+            if self.enabled:
+                self.report(name)
+
+    def measure(self, name, elapsed):
+        self.durations[name] = elapsed
+        if self.enabled:
+            self.report_duration(name)
+
+    def report(self, name):
+        print('startup: %-12s %8.1f ms' % (name, self.marks[name] * 1000))
+
+    def report_duration(self, name):
+        print('startup: %-12s %8.1f ms elapsed' % (
+            name,
+            self.durations[name] * 1000
+            ))
+
+
+class SignalProfiler(object):
+    '''
+    Signal handler timing aggregator, with a watchdog thread reporting
+    main loop stalls along with the handler running at the time.
+    '''
+    stall_threshold = 0.25
+    heartbeat_interval = 0.05
+
+    def __init__(self):
+        self.stats = collections.OrderedDict()
+        self.stalls = collections.deque(maxlen=100)
+        self.stack = []
+        self.heartbeat = None
+        self.culprit = None
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def wrap(self, spec, handler):
+        stats = self.stats.setdefault(spec, [0, 0., 0.])
+
+        @functools.wraps(handler)
+        def wrapper(*args):
+            self.stack.append(spec)
+            start = time.perf_counter()
+            try:
+                return handler(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.stack.pop()
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+        return wrapper
+
+    def start(self):
+        if self.thread:
+            return
+        self.heartbeat = time.monotonic()
+        GLib.timeout_add(int(self.heartbeat_interval * 1000), self.beat)
+        self.thread = threading.Thread(
+            target=self.watch,
+            name='SignalProfiler',
+            daemon=True,
+            )
+        self.thread.start()
+
+    def beat(self):
+        now = time.monotonic()
+        elapsed = now - self.heartbeat
+        if elapsed > self.stall_threshold:
+            culprit = self.culprit or 'unknown'
+            self.stalls.append((culprit, elapsed))
+            logger.warning(
+                'main loop stalled for %.0f ms in %s', elapsed * 1000, culprit
+                )
+        self.heartbeat = now
+        self.culprit = None
+        return True
+
+    def watch(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            stack = self.stack[:]
+            stalled = time.monotonic() - self.heartbeat > self.stall_threshold
+            if stalled and stack and not self.culprit:
+                self.culprit = stack[-1]
+
+    def dump(self):
+        lines = [
+            '%-40s %8s %12s %10s' % ('signal', 'count', 'total ms', 'max ms')
+            ]
+        lines.extend(
+            '%-40s %8d %12.1f %10.1f' % (
+                spec, count, total * 1000, maximum * 1000
+                )
+            for spec, (count, total, maximum) in sorted(
+                self.stats.items(),
+                key=lambda item: item[1][1],
+                reverse=True
+                )
+            if count
+            )
+        lines.extend(
+            'stall %8.1f ms in %s' % (elapsed * 1000, culprit)
+            for culprit, elapsed in self.stalls
+            )
+        return '\n'.join(lines)
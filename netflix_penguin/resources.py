@@ -1,33 +1,312 @@
 
 import os
 import os.path
+import re
+import time
+import threading
 import appdirs
 
 from . import __meta__ as meta
+from .gi import Gio, GLib
+
+
+def load_bundle(path):
+    '''
+    Memory-map and register a compiled resource bundle, returns True if
+    available (bundles are only built on install, not on source checkouts).
+    '''
+    try:
+        Gio.Resource.load(path)._register()
+    except GLib.Error:
+        return False
+    return True
+
+
+def locate(name):
+    '''
+    Get resource uri of a bundled file, or its path if not bundled.
+    '''
+    if bundled:
+        return 'resource://{}/{}'.format(bundle_prefix, name)
+    return os.path.join(meta.__basedir__, name)
+
 
 dirs = appdirs.AppDirs(meta.__app__, meta.__org__)
-layout = os.path.join(meta.__basedir__, 'layout.glade')
-menu = os.path.join(meta.__basedir__, 'menu.xml')
+bundle = os.path.join(meta.__basedir__, '%s.gresource' % meta.__app__)
+bundle_prefix = '/org/{}/{}'.format(meta.__org__, meta.__app__)
+bundled = load_bundle(bundle)
+layout = locate('layout.glade')
+menu = locate('menu.xml')
+bundle_icons = '%s/icons' % bundle_prefix
+policy = os.path.join(meta.__basedir__, 'policy.json')
+filters = os.path.join(meta.__basedir__, 'filters.json')
 cache_dir = dirs.user_cache_dir
+data_dir = dirs.user_data_dir
+config_dir = dirs.user_config_dir
 storage = os.path.join(cache_dir, 'storage')
+filter_store = os.path.join(cache_dir, 'filters')
+warmup = os.path.join(cache_dir, 'warmup.json')
+plugins = os.path.join(cache_dir, 'plugins.json')
+settings = os.path.join(config_dir, 'settings.json')
+playback = os.path.join(data_dir, 'playback.jsonl')
+session = os.path.join(data_dir, 'session.json')
+accounts_cache_dir = os.path.join(cache_dir, 'accounts')
+accounts_data_dir = os.path.join(data_dir, 'accounts')
 
 
 def create_dirs():
-    for dirname in [cache_dir]:
+    for dirname in [cache_dir, data_dir, config_dir]:
         if not os.path.exists(dirname):
             os.makedirs(dirname)
 
 
-def count_cache_size():
-    return count_size([cache_dir])
+class SizeIndexer(object):
+    '''
+    Directory size counter running on a worker thread, caching per-directory
+    listings by mtime so rescans only list directories whose entries changed.
+
+    Files growing in place (like databases) do not change their directory
+    mtime, with `restat` the files of unchanged directories are stat'ed on
+    every rescan too. Directories in `exclude` are not counted.
+    '''
+    report_interval = 0.1
+
+    def __init__(self, directories, restat=False, exclude=()):
+        self.directories = directories
+        self.restat = restat
+        self.exclude = frozenset(exclude)
+        self.index = {}
+        self.callbacks = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pending = False
+
+    def update(self, callback):
+        '''
+        Request a rescan, calling `callback(size, finished)` on main loop.
+        '''
+        with self.lock:
+            self.callbacks.append(callback)
+            if self.thread:
+                self.pending = True
+                return
+            self.thread = threading.Thread(
+                target=self.run,
+                name='SizeIndexer',
+                daemon=True,
+                )
+            self.thread.start()
+
+    def run(self):
+        while True:
+            with self.lock:
+                self.pending = False
+                callbacks = self.callbacks[:]
+            size = self.scan(callbacks)
+            with self.lock:
+                if self.pending:
+                    continue
+                self.thread = None
+                self.callbacks[:] = [
+                    callback
+                    for callback in self.callbacks
+                    if callback not in callbacks
+                    ]
+            self.notify(callbacks, size, True)
+            return
+
+    def notify(self, callbacks, size, finished):
+        for callback in callbacks:
+            GLib.idle_add(callback, size, finished)
+
+    def scan(self, callbacks):
+        index = {}
+        total = 0
+        last = time.monotonic()
+        stack = [
+            directory
+            for directory in reversed(self.directories)
+            if os.path.isdir(directory)
+            ]
+        while stack:
+            path = stack.pop()
+            if path in self.exclude:
+                continue
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            entry = self.index.get(path)
+            if not entry or entry[0] != mtime:
+                entry = self.scan_dir(path, mtime)
+            elif self.restat:
+                entry = self.stat_files(entry)
+            index[path] = entry
+            total += entry[1]
+            stack.extend(entry[2])
+            now = time.monotonic()
+            if now - last > self.report_interval:
+                last = now
+                self.notify(callbacks, total, False)
+        self.index = index
+        return total
+
+    def scan_dir(self, path, mtime):
+        size = 0
+        subdirs = []
+        files = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            size += entry.stat(follow_symlinks=False).st_size
+                            files.append(entry.path)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        return mtime, size, subdirs, files
+
+    def stat_files(self, entry):
+        mtime, size, subdirs, files = entry
+        size = 0
+        for path in files:
+            try:
+                size += os.lstat(path).st_size
+            except OSError:
+                pass
+        return mtime, size, subdirs, files
+
+
+class CacheTrimmer(object):
+    '''
+    Disk budget enforcer, evicting least recently used WebKit disk cache
+    records on a worker thread until their size is below `low_watermark`
+    of the budget.
+
+    Only record files (and their body blob links) are touched, WebKit
+    treats a missing record as a cache miss, while its salt, blob store
+    and databases must stay in place.
+    '''
+    low_watermark = 0.9
+    re_record = re.compile(r'/WebKitCache/Version [^/]+/Records/')
+    blob_suffix = '-blob'
+
+    def __init__(self, directory, exclude=()):
+        self.directory = directory
+        self.exclude = tuple(exclude)
+        self.thread = None
+        self.evicted = 0
+
+    def trim(self, budget, callback):
+        '''
+        Start trimming, calling `callback(size, evicted)` on main loop,
+        returns False (and callback will not be called) if already running.
+        '''
+        return self.start(self.run, budget, callback)
+
+    def expire(self, max_age, callback):
+        '''
+        Start removing records unused for `max_age` seconds, calling
+        `callback(size, evicted)` on main loop, returns False (and callback
+        will not be called) if already running.
+        '''
+        return self.start(self.run_expire, max_age, callback)
+
+    def start(self, target, *args):
+        if self.thread:
+            return False
+        self.thread = threading.Thread(
+            target=target,
+            args=args,
+            name='CacheTrimmer',
+            daemon=True,
+            )
+        self.thread.start()
+        return True
+
+    def run(self, budget, callback):
+        entries = self.scan()
+        size = sum(entry[1] for entry in entries)
+        evicted = 0
+        if size > budget:
+            target = budget * self.low_watermark
+            entries.sort()
+            for last_use, filesize, paths in entries:
+                if size - evicted <= target:
+                    break
+                evicted += self.remove(paths, filesize)
+            size -= evicted
+        self.finish(size, evicted, callback)
+
+    def run_expire(self, max_age, callback):
+        entries = self.scan()
+        size = sum(entry[1] for entry in entries)
+        evicted = 0
+        cutoff = time.time() - max_age
+        for last_use, filesize, paths in entries:
+            if last_use < cutoff:
+                evicted += self.remove(paths, filesize)
+        size -= evicted
+        self.finish(size, evicted, callback)
+
+    def remove(self, paths, size):
+        # record first, so WebKit never finds it without its blob
+        try:
+            for path in sorted(paths, key=len):
+                os.remove(path)
+        except OSError:
+            return 0
+        return size
+
+    def finish(self, size, evicted, callback):
+        self.evicted += evicted
+        self.thread = None
+        GLib.idle_add(callback, size, evicted)
+
+    def scan(self):
+        '''
+        List cache records as `(last_use, size, paths)` tuples.
+        '''
+        records = {}
+        stack = [self.directory]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as iterator:
+                    for entry in iterator:
+                        if entry.path.startswith(self.exclude):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif (
+                          entry.is_file(follow_symlinks=False) and
+                          self.re_record.search(entry.path)
+                          ):
+                            self.add_record(records, entry)
+            except OSError:
+                pass
+        return list(records.values())
+
+    def add_record(self, records, entry):
+        key = entry.path
+        if key.endswith(self.blob_suffix):
+            key = key[:-len(self.blob_suffix)]
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            return
+        last_use, size, paths = records.get(key, (0, 0, ()))
+        records[key] = (
+            max(last_use, stat.st_atime, stat.st_mtime),
+            size + stat.st_size,
+            paths + (entry.path,)
+            )
 
 
-def count_size(directories):
-    join = os.path.join
-    getsize = os.path.getsize
-    return sum(
-        getsize(join(root, name))
-        for directory in directories
-        for root, dirs, files in os.walk(directory)
-        for name in files
-        )
+cache_trimmer = CacheTrimmer(
+    cache_dir,
+    exclude=[storage, filter_store, warmup, plugins]
+    )
@@ -0,0 +1,88 @@
+
+import os
+import json
+import base64
+import hashlib
+import logging
+
+from .gi import GLib, WebKit2
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(object):
+    '''
+    WebView session state (back/forward list) and last uri, serialized
+    to a JSON file, only written when changed.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.digest = None
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or not isinstance(data['uri'], str):
+                raise ValueError('not a session object')
+            state = data.get('state')
+            return data['uri'], base64.b64decode(state) if state else None
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error('cannot load %s: %s', self.path, e)
+        return None, None
+
+    def save(self, webview, uri=None):
+        '''
+        Save webview session, or only given uri (when webview no longer
+        shows it, like while suspended).
+        '''
+        state = None
+        if uri is None:
+            uri = webview.get_uri()
+            state = webview.get_session_state().serialize().get_data()
+        if not uri:
+            return
+        data = json.dumps({
+            'uri': uri,
+            'state': base64.b64encode(state).decode() if state else None,
+            })
+        digest = hashlib.sha1(data.encode()).digest()
+        if digest == self.digest:
+            return
+        partial = '%s.partial' % self.path
+        try:
+            with open(partial, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(partial, self.path)
+        except OSError as e:
+            logger.error('cannot save %s: %s', self.path, e)
+            return
+        self.digest = digest
+
+    def restore(self, webview, accept):
+        '''
+        Load saved session into webview, returns False if there is none or
+        it is invalid, or if its uri is not accepted by `accept(uri)`.
+        '''
+        uri, state = self.load()
+        if not uri or not accept(uri):
+            return False
+        if state:
+            try:
+                session = WebKit2.WebViewSessionState.new(
+                    GLib.Bytes.new(state)
+                    )
+            except (GLib.Error, TypeError) as e:
+                logger.warning('invalid session state: %s', e)
+                session = None
+            if session is not None:
+                webview.restore_session_state(session)
+                history = webview.get_back_forward_list()
+                item = history.get_current_item()
+                if item is not None and accept(item.get_uri()):
+                    webview.go_to_back_forward_list_item(item)
+                    return True
+        webview.load_uri(uri)
+        return True
@@ -0,0 +1,48 @@
+
+import os
+import json
+import logging
+
+from . import performance
+from .collections import AttrDefaultDict
+
+logger = logging.getLogger(__name__)
+
+
+class Settings(AttrDefaultDict):
+    '''
+    User settings persisted as JSON, falling back to class defaults.
+    '''
+    defaults = {
+        'cache_budget': 1024 ** 3,
+        'performance_profile': performance.DEFAULT,
+        'resident': False,
+        'idle_memory_delay': 300,
+        'popup_pool_size': 1,
+        }
+
+    def __init__(self, path):
+        super(Settings, self).__init__()
+        self.__dict__['path'] = path
+        self.load()
+
+    def __missing__(self, key):
+        return self.defaults.get(key)
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.error('cannot load %s: %s', self.path, e)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        partial = '%s.partial' % self.path
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump(self, f, indent=2, sort_keys=True)
+        os.replace(partial, self.path)
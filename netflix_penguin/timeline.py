@@ -0,0 +1,205 @@
+
+import json
+import time
+import logging
+import datetime
+import collections
+import urllib.parse
+
+from . import __meta__ as meta
+from .gi import WebKit2
+
+logger = logging.getLogger(__name__)
+
+
+def iso_time(timestamp):
+    return datetime.datetime.fromtimestamp(
+        timestamp,
+        datetime.timezone.utc
+        ).isoformat()
+
+
+def header_list(headers):
+    result = []
+    if headers is not None:
+        headers.foreach(
+            lambda name, value: result.append({'name': name, 'value': value})
+            )
+    return result
+
+
+def elapsed(start, end):
+    '''
+    Milliseconds between two timestamps, or -1 if any is missing.
+    '''
+    if start is None or end is None:
+        return -1
+    return round((end - start) * 1000, 3)
+
+
+class NetworkTimeline(object):
+    '''
+    Network timeline of the last `max_pages` navigations, timestamping
+    every load event and every sub-resource (start, response, finish or
+    failure), exportable in HAR 1.2 format.
+
+    Sizes are taken from response content lengths when resources finish,
+    as a per-chunk data handler would run for every media segment chunk.
+    '''
+    max_pages = 10
+    max_entries = 2000
+
+    def __init__(self, max_pages=None):
+        if max_pages is not None:
+            self.max_pages = max_pages
+        self.pages = collections.deque(maxlen=self.max_pages)
+        self.current = {}
+        self.sequence = 0
+
+    def on_load_change(self, webview, event):
+        key = id(webview)
+        page = self.current.get(key)
+        if event == WebKit2.LoadEvent.STARTED or page is None:
+            self.sequence += 1
+            page = {
+                'id': 'page_%d' % self.sequence,
+                'uri': webview.get_uri(),
+                'title': None,
+                'events': {},
+                'entries': [],
+                }
+            self.current[key] = page
+            self.pages.append(page)
+        page['events'][event.value_nick] = time.time()
+        if event == WebKit2.LoadEvent.FINISHED:
+            page['uri'] = webview.get_uri()
+            page['title'] = webview.get_title()
+
+    def on_resource_load(self, webview, resource, request):
+        page = self.current.get(id(webview))
+        if page is None or len(page['entries']) >= self.max_entries:
+            return
+        entry = {
+            'started': time.time(),
+            'response': None,
+            'finished': None,
+            'error': None,
+            'size': -1,
+            'method': request.get_http_method() or 'GET',
+            'uri': request.get_uri(),
+            'request_headers': header_list(request.get_http_headers()),
+            }
+        page['entries'].append(entry)
+        resource.connect('notify::response', self.on_response, entry)
+        resource.connect('finished', self.on_finished, entry)
+        resource.connect('failed', self.on_failed, entry)
+
+    def on_response(self, resource, param, entry):
+        entry['response'] = time.time()
+
+    def on_finished(self, resource, entry):
+        entry['finished'] = time.time()
+        response = resource.get_response()
+        if response is not None:
+            entry['status'] = response.get_status_code()
+            entry['size'] = response.get_content_length() or -1
+            entry['mime_type'] = response.get_mime_type()
+            entry['response_headers'] = header_list(
+                response.get_http_headers()
+                )
+
+    def on_failed(self, resource, error, entry):
+        entry['error'] = error.message
+        self.on_finished(resource, entry)
+
+    def har_page(self, page):
+        events = page['events']
+        started = events.get('started') or min(events.values())
+        return {
+            'startedDateTime': iso_time(started),
+            'id': page['id'],
+            'title': page['title'] or page['uri'] or '',
+            'pageTimings': {
+                'onContentLoad': elapsed(started, events.get('committed')),
+                'onLoad': elapsed(started, events.get('finished')),
+                },
+            }
+
+    def har_entry(self, page, entry):
+        end = entry['finished']
+        wait = elapsed(entry['started'], entry['response'] or end)
+        receive = elapsed(entry['response'], end)
+        query = urllib.parse.parse_qsl(
+            urllib.parse.urlsplit(entry['uri']).query,
+            keep_blank_values=True
+            )
+        har = {
+            'pageref': page['id'],
+            'startedDateTime': iso_time(entry['started']),
+            'time': elapsed(entry['started'], end),
+            'request': {
+                'method': entry['method'],
+                'url': entry['uri'],
+                'httpVersion': 'HTTP/1.1',
+                'cookies': [],
+                'headers': entry['request_headers'],
+                'queryString': [
+                    {'name': name, 'value': value}
+                    for name, value in query
+                    ],
+                'headersSize': -1,
+                'bodySize': -1,
+                },
+            'response': {
+                'status': entry.get('status', 0),
+                'statusText': entry['error'] or '',
+                'httpVersion': 'HTTP/1.1',
+                'cookies': [],
+                'headers': entry.get('response_headers', []),
+                'content': {
+                    'size': max(entry['size'], 0),
+                    'mimeType': entry.get('mime_type') or '',
+                    },
+                'redirectURL': '',
+                'headersSize': -1,
+                'bodySize': entry['size'] if end else -1,
+                },
+            'cache': {},
+            'timings': {
+                'send': 0,
+                'wait': max(wait, 0),
+                'receive': max(receive, 0),
+                },
+            }
+        if entry['error']:
+            har['_error'] = entry['error']
+        return har
+
+    def har(self):
+        pages = [page for page in self.pages if page['events']]
+        return {
+            'log': {
+                'version': '1.2',
+                'creator': {
+                    'name': meta.__app__,
+                    'version': meta.__version__,
+                    },
+                'pages': [self.har_page(page) for page in pages],
+                'entries': [
+                    self.har_entry(page, entry)
+                    for page in pages
+                    for entry in page['entries']
+                    ],
+                },
+            }
+
+    def export(self, path):
+        data = self.har()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        logger.info(
+            'exported %d pages, %d entries to %s',
+            len(data['log']['pages']),
+            len(data['log']['entries']),
+            path
+            )
@@ -0,0 +1,78 @@
+
+import logging
+import collections
+
+from .gi import WebKit2
+
+logger = logging.getLogger(__name__)
+
+Script = collections.namedtuple(
+    'Script',
+    ('source', 'allow', 'block', 'all_frames', 'at_end')
+    )
+
+
+class UserScriptRegistry(object):
+    '''
+    Named user scripts, each injected only into pages matching its origin
+    allow-list (WebKit url patterns such as `*://*.netflix.com/*`), and
+    only into top frames unless `all_frames` is given.
+
+    Changes are applied to every installed UserContentManager.
+    '''
+    def __init__(self):
+        self.scripts = collections.OrderedDict()
+        self.managers = []
+        self.compiled = None
+
+    def add(self, name, source, allow=(), block=(), all_frames=False,
+            at_end=False):
+        '''
+        Add or replace a script, empty `allow` means every origin.
+        '''
+        self.scripts[name] = Script(
+            source,
+            tuple(allow),
+            tuple(block),
+            all_frames,
+            at_end
+            )
+        self.refresh()
+
+    def remove(self, name):
+        if self.scripts.pop(name, None) is not None:
+            self.refresh()
+
+    def compile(self):
+        if self.compiled is None:
+            self.compiled = [
+                WebKit2.UserScript.new(
+                    script.source,
+                    WebKit2.UserContentInjectedFrames.ALL_FRAMES
+                    if script.all_frames else
+                    WebKit2.UserContentInjectedFrames.TOP_FRAME,
+                    WebKit2.UserScriptInjectionTime.END
+                    if script.at_end else
+                    WebKit2.UserScriptInjectionTime.START,
+                    script.allow or None,
+                    script.block or None
+                    )
+                for script in self.scripts.values()
+                ]
+        return self.compiled
+
+    def install(self, manager):
+        self.managers.append(manager)
+        for script in self.compile():
+            manager.add_script(script)
+
+    def refresh(self):
+        self.compiled = None
+        if not self.managers:
+            return
+        logger.debug('reinstalling %d user scripts', len(self.scripts))
+        scripts = self.compile()
+        for manager in self.managers:
+            manager.remove_all_scripts()
+            for script in scripts:
+                manager.add_script(script)
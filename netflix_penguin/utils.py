@@ -1,4 +1,6 @@
+import gc
 import math
+import ctypes
 
 
 SIZE_UNITS = ('bytes', 'KiB', 'MiB', 'GiB', 'TiB', 'PiB', 'EiB', 'ZiB', 'YiB')
@@ -7,3 +9,14 @@ SIZE_UNITS = ('bytes', 'KiB', 'MiB', 'GiB', 'TiB', 'PiB', 'EiB', 'ZiB', 'YiB')
 def human_size(size, units=SIZE_UNITS):
     order = int(math.log2(size) / 10) if size else 0
     return '{:.3g} {}'.format(size / (1 << (order * 10)), units[order])
+
+
+def release_memory():
+    '''
+    Collect python garbage and return free heap pages to the system.
+    '''
+    gc.collect()
+    try:
+        ctypes.CDLL(None).malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
@@ -0,0 +1,125 @@
+
+import json
+import time
+import logging
+import collections
+import urllib.parse
+
+from .policy import ACCEPT
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup(object):
+    '''
+    Learns which hosts every page class (first path segment of accepted
+    uris, like `browse`, `title` or `watch`) contacts, and which page class
+    usually comes next, to prefetch DNS for them ahead of navigation.
+    '''
+    max_hosts = 24
+    max_next = 2
+    prefetch_ttl = 60
+
+    def __init__(self, path, policy):
+        self.path = path
+        self.policy = policy
+        self.hosts = collections.defaultdict(collections.Counter)
+        self.transitions = collections.defaultdict(collections.Counter)
+        self.prefetched = {}
+        self.stats = collections.Counter(prefetched=0, hits=0)
+        self.current = None
+        self.hovered = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error('cannot load %s: %s', self.path, e)
+            return
+        for name, hosts in data.get('hosts', {}).items():
+            self.hosts[name].update(hosts)
+        for name, transitions in data.get('transitions', {}).items():
+            self.transitions[name].update(transitions)
+
+    def save(self):
+        data = {
+            'hosts': {
+                name: dict(hosts.most_common(self.max_hosts))
+                for name, hosts in self.hosts.items()
+                },
+            'transitions': {
+                name: dict(transitions)
+                for name, transitions in self.transitions.items()
+                },
+            }
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        except OSError as e:
+            logger.error('cannot save %s: %s', self.path, e)
+
+    def page_class(self, uri):
+        if self.policy.decide(uri) != ACCEPT:
+            return None
+        for segment in urllib.parse.urlsplit(uri).path.split('/'):
+            if len(segment) > 2:
+                return segment.lower()
+        return None
+
+    def prefetch(self, context, name):
+        now = time.monotonic()
+        for host, count in self.hosts[name].most_common(self.max_hosts):
+            if host in self.prefetched:
+                continue
+            context.prefetch_dns(host)
+            self.prefetched[host] = now
+            self.stats['prefetched'] += 1
+
+    def prefetch_next(self, context, name):
+        transitions = self.transitions[name].most_common(self.max_next)
+        for following, count in transitions:
+            self.prefetch(context, following)
+
+    def start(self, context, uri):
+        name = self.page_class(uri)
+        if name:
+            self.prefetch(context, name)
+            self.prefetch_next(context, name)
+
+    def on_commit(self, webview):
+        self.expire()
+        name = self.page_class(webview.get_uri() or '')
+        if self.current and name:
+            self.transitions[self.current][name] += 1
+        self.current = name
+        if name:
+            self.prefetch_next(webview.get_context(), name)
+
+    def expire(self):
+        deadline = time.monotonic() - self.prefetch_ttl
+        for host, prefetched in list(self.prefetched.items()):
+            if prefetched < deadline:
+                del self.prefetched[host]
+
+    def on_resource_load(self, webview, resource, request):
+        host = urllib.parse.urlsplit(request.get_uri()).hostname
+        if not host:
+            return
+        if self.current:
+            self.hosts[self.current][host] += 1
+        prefetched = self.prefetched.pop(host, None)
+        if prefetched and time.monotonic() - prefetched < self.prefetch_ttl:
+            self.stats['hits'] += 1
+
+    def on_mouse_target(self, webview, hit, modifiers):
+        if not hit.context_is_link():
+            self.hovered = None
+            return
+        name = self.page_class(hit.get_link_uri())
+        if name and name != self.hovered:
+            self.hovered = name
+            self.prefetch(webview.get_context(), name)
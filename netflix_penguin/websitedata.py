@@ -0,0 +1,211 @@
+
+import os
+import logging
+import functools
+import collections
+
+from .gi import GLib, WebKit2
+from .resources import SizeIndexer, CacheTrimmer
+
+logger = logging.getLogger(__name__)
+
+categories = collections.OrderedDict((
+    ('disk-cache', {
+        'label': 'HTTP cache',
+        'type': 'DISK_CACHE',
+        'directory': 'get_disk_cache_directory',
+        'cache': 'WebKitCache',
+        }),
+    ('offline-cache', {
+        'label': 'Offline application cache',
+        'type': 'OFFLINE_APPLICATION_CACHE',
+        'directory': 'get_offline_application_cache_directory',
+        }),
+    ('local-storage', {
+        'label': 'Local storage',
+        'type': 'LOCAL_STORAGE',
+        'directory': 'get_local_storage_directory',
+        }),
+    ('indexeddb', {
+        'label': 'IndexedDB databases',
+        'type': 'INDEXEDDB_DATABASES',
+        'directory': 'get_indexeddb_directory',
+        }),
+    ('websql', {
+        'label': 'WebSQL databases',
+        'type': 'WEBSQL_DATABASES',
+        'directory': 'get_websql_directory',
+        }),
+    ('cookies', {
+        'label': 'Cookies',
+        'type': 'COOKIES',
+        'directory': None,
+        }),
+    ))
+
+
+def data_types(names=None):
+    '''
+    Get WebKit2.WebsiteDataTypes flags for given category names (or all).
+    '''
+    types = 0
+    for name in categories if names is None else names:
+        types |= getattr(WebKit2.WebsiteDataTypes, categories[name]['type'])
+    return WebKit2.WebsiteDataTypes(types)
+
+
+class WebsiteDataUsage(object):
+    '''
+    Per-category website data accounting, using WebKit asynchronous data
+    queries for origin counts and disk cache size, and per-directory size
+    indexers for categories WebKit does not report sizes for.
+    '''
+    def __init__(self, manager, cookie_storage_path):
+        self.manager = manager
+        self.cookie_storage_path = cookie_storage_path
+        self.sizes = dict.fromkeys(categories, 0)
+        self.origins = dict.fromkeys(categories, 0)
+        self.pending = 0
+        self.indexers = {}
+        directories = {}
+        for name, category in categories.items():
+            getter = category['directory']
+            directory = getattr(manager, getter)() if getter else None
+            if directory and name != 'disk-cache':
+                directories[name] = os.path.normpath(directory)
+        for name, directory in directories.items():
+            # like indexeddb, which WebKit keeps inside websql directory
+            nested = [
+                other
+                for other in directories.values()
+                if other.startswith(directory + os.sep)
+                ]
+            self.indexers[name] = SizeIndexer(
+                [directory],
+                restat=True,
+                exclude=nested
+                )
+
+    @property
+    def total(self):
+        return sum(self.sizes.values())
+
+    @property
+    def finished(self):
+        return not self.pending
+
+    def update(self, callback):
+        '''
+        Refresh usage, calling `callback(usage)` on main loop on changes,
+        including partial sizes while directories are being scanned.
+        '''
+        self.pending += 1 + len(self.indexers)
+        self.manager.fetch(data_types(), None, self.on_fetch, callback)
+        for name, indexer in self.indexers.items():
+            indexer.update(functools.partial(self.on_size, callback, name))
+        self.update_cookies()
+        callback(self)
+
+    def update_cookies(self):
+        try:
+            self.sizes['cookies'] = os.stat(self.cookie_storage_path).st_size
+        except OSError:
+            self.sizes['cookies'] = 0
+
+    def on_fetch(self, manager, result, callback):
+        self.pending -= 1
+        try:
+            records = manager.fetch_finish(result)
+        except GLib.Error as e:
+            logger.warning('website data query failed: %s', e)
+            callback(self)
+            return
+        disk_cache = WebKit2.WebsiteDataTypes.DISK_CACHE
+        flags = [(name, data_types((name,))) for name in categories]
+        origins = dict.fromkeys(categories, 0)
+        cache_size = 0
+        for record in records:
+            types = record.get_types()
+            for name, flag in flags:
+                if types & flag:
+                    origins[name] += 1
+            if types & disk_cache:
+                cache_size += record.get_size(disk_cache)
+        self.origins = origins
+        self.sizes['disk-cache'] = cache_size
+        callback(self)
+
+    def on_size(self, callback, name, size, finished):
+        self.sizes[name] = size
+        if finished:
+            self.pending -= 1
+        callback(self)
+        return False
+
+
+class WebsiteDataCleaner(object):
+    '''
+    Asynchronous website data removal.
+
+    WebKit can only clear data modified within a timespan, so age-limited
+    removal is restricted to cache categories (those with a `cache` entry),
+    whose records are expired by last use instead. Other categories live in
+    databases WebKit keeps open, so they are never removed by age.
+    '''
+    def __init__(self, manager):
+        self.manager = manager
+        self.pending = 0
+        self.callback = None
+
+    @property
+    def running(self):
+        return self.pending > 0
+
+    @staticmethod
+    def expirable(name):
+        return categories[name].get('cache') is not None
+
+    def clear(self, names, max_age, callback):
+        '''
+        Remove data of given categories, older than `max_age` seconds if
+        non-zero, calling `callback()` on main loop when done.
+        '''
+        if self.running:
+            return False
+        self.callback = callback
+        if not max_age:
+            self.pending = 1
+            self.manager.clear(data_types(names), 0, None, self.on_clear)
+            return True
+        for name in names:
+            if not self.expirable(name):
+                continue
+            category = categories[name]
+            directory = getattr(self.manager, category['directory'])()
+            if not directory:
+                continue
+            trimmer = CacheTrimmer(os.path.join(directory, category['cache']))
+            if trimmer.expire(max_age, self.on_expire):
+                self.pending += 1
+        if not self.pending:
+            self.pending = 1
+            GLib.idle_add(self.finish)
+        return True
+
+    def on_clear(self, manager, result):
+        try:
+            manager.clear_finish(result)
+        except GLib.Error as e:
+            logger.warning('website data removal failed: %s', e)
+        self.finish()
+
+    def on_expire(self, size, evicted):
+        logger.debug('expired %d bytes of cache', evicted)
+        self.finish()
+
+    def finish(self):
+        self.pending -= 1
+        if not self.pending:
+            callback, self.callback = self.callback, None
+            callback()
+        return False
@@ -73,14 +73,14 @@ setup(
             'StartupNotify': 'true',
             },
         },
-    package_data={meta_module: ['layout.glade', 'menu.xml']},
-    data_files=[(
-            'share/icons/hicolor/{0}x{0}/apps'.format(size),
-            ['icons/{}/{}.png'.format(size, meta_app)])
-            for size in (16, 22, 24, 32, 48, 128, 256, 512)
-        ] + [
-            ('share/icons/hicolor/scalable/apps', ['icons/%s.svg' % meta_app])
-        ],
+    package_data={meta_module: [
+        'layout.glade', 'menu.xml', 'policy.json', 'filters.json',
+        ]},
+    icons={meta_app: 'icons/%s.svg' % meta_app},
+    resource_bundles={
+        '%s/%s.gresource' % (meta_module, meta_app):
+            '%s/%s.gresource.xml' % (meta_module, meta_app),
+        },
     install_requires=['pygobject', 'appdirs'],
     distclass=Distribution,
     zip_safe=False,